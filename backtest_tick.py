@@ -24,6 +24,10 @@ from vnpy.trader.database import get_database
 from vnpy_ctastrategy import CtaStrategyApp
 from vnpy_ctastrategy.backtesting import BacktestingEngine, OptimizationSetting
 
+from convert_cpt_tick_to_vnpy import CtpTickConverter, CtpTickStream
+from tick_store import list_partitions, read_tick_store
+from upload_cffex_tick_data import CFFEXTickDataImporterFixed
+
 # TODO 在这里import 你的策略，例如MyTurtleStrategy
 # from vnpy_ctastrategy.strategies.my_turtle_strategy import MyTurtleStrategy as MyStrategy  # 修改为你的策略路径
 from vnpy_ctastrategy.strategies.my_turtle_strategy_v2 import MyTurtleStrategyV2 as MyBarStrategy
@@ -205,6 +209,109 @@ class BacktestRunner:
             traceback.print_exc()
             return False
 
+    def load_data_from_ctp_files(self, file_paths):
+        """
+        从CTP格式的Tick CSV文件直接回放，不经过数据库（仅Tick模式）
+
+        每个文件必须已按时间排序（CTP导出文件均如此）；没有排序的文件在计数时报错，
+        需要先用convert_cpt_tick_to_vnpy转换入库后从数据库回测
+        """
+        print(f"\n从CTP文件加载TICK数据: {file_paths}")
+
+        if self.backtest_mode != "tick":
+            print("❌ 错误：CTP文件只能用于Tick回测")
+            return False
+
+        try:
+            symbol = self.backtesting_engine.symbol
+            exchange = self.backtesting_engine.exchange
+            start_time = self.backtesting_engine.start
+            end_time = self.backtesting_engine.end
+
+            print(f"过滤条件:")
+            print(f"  合约: {symbol}.{exchange.value}")
+            print(f"  时间: {start_time} 到 {end_time}")
+
+            # 回放时按时间顺序逐块读取文件，内存占用与数据量无关
+            data = CtpTickStream(
+                CtpTickConverter(),
+                file_paths,
+                symbol_filter=symbol,
+                start=start_time,
+                end=end_time,
+                exchange=exchange,
+            )
+
+            count = len(data)
+            if not count:
+                print(f"❌ 错误：文件中没有 {symbol} 在指定时间范围的Tick数据！")
+                return False
+
+            print(f"✅ 共 {count} 条Tick数据，回放时逐块读取")
+
+            self.backtesting_engine.history_data = data
+            self.backtesting_engine.loaded_data = True
+
+            return True
+
+        except Exception as e:
+            print(f"❌ 数据加载失败: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+    def load_data_from_tick_store(self, store_path):
+        """从预处理生成的Parquet存储（产品/交易日.parquet）加载Tick数据，不经过数据库（仅Tick模式）"""
+        print(f"\n从Parquet存储加载TICK数据: {store_path}")
+
+        if self.backtest_mode != "tick":
+            print("❌ 错误：Parquet存储只能用于Tick回测")
+            return False
+
+        try:
+            symbol = self.backtesting_engine.symbol
+            exchange = self.backtesting_engine.exchange
+            start_time = self.backtesting_engine.start
+            end_time = self.backtesting_engine.end
+
+            print(f"过滤条件:")
+            print(f"  合约: {symbol}.{exchange.value}")
+            print(f"  时间: {start_time} 到 {end_time}")
+
+            # 按交易日跳过分区文件；夜盘Tick归属下一交易日，上界放宽7天，由行组和行过滤精确截取
+            paths = list_partitions(
+                store_path,
+                start_date=start_time.strftime("%Y%m%d") if start_time else None,
+                end_date=(end_time + timedelta(days=7)).strftime("%Y%m%d") if end_time else None,
+            )
+            df = read_tick_store(paths, symbols=[symbol], start=start_time, end=end_time)
+
+            # 与导入数据库相同的解析和去重规则
+            importer = CFFEXTickDataImporterFixed(connect_database=False)
+            importer.exchange = exchange
+            frame = importer.parse_frame(df, importer.TICK_FIELDS)
+            frame = frame.drop_duplicates(subset=['symbol', 'datetime'], keep='first')
+            frame = frame.sort_values('datetime', kind='stable')
+            data = importer.frame_to_ticks(frame)
+
+            if not data:
+                print(f"❌ 错误：存储中没有 {symbol} 在指定时间范围的Tick数据！")
+                return False
+
+            print(f"✅ 从 {len(paths)} 个分区文件加载 {len(data)} 条Tick数据")
+            print(f"   时间范围: {data[0].datetime} 到 {data[-1].datetime}")
+
+            self.backtesting_engine.history_data = data
+            self.backtesting_engine.loaded_data = True
+
+            return True
+
+        except Exception as e:
+            print(f"❌ 数据加载失败: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
     def run_backtest(self, strategy_class, strategy_params=None):
         """运行回测，支持Bar和Tick两种模式"""
         if strategy_params is None:
@@ -540,8 +647,8 @@ def run_bar_backtest(mode, vt_symbol, start_date, end_date):
         traceback.print_exc()
 
 
-def run_tick_backtest(mode, vt_symbol, start_date, end_date):
-    """运行Tick级别回测示例"""
+def run_tick_backtest(mode, vt_symbol, start_date, end_date, ctp_files=None, tick_store=None):
+    """运行Tick级别回测示例，指定ctp_files时直接从CTP文件回放，指定tick_store时从Parquet存储加载"""
     print("=" * 70)
     print("运行Tick级别回测")
     print("=" * 70)
@@ -572,7 +679,15 @@ def run_tick_backtest(mode, vt_symbol, start_date, end_date):
         )
 
         # 加载数据
-        if not runner.load_data_from_database():
+        if ctp_files:
+            if not runner.load_data_from_ctp_files(ctp_files):
+                print("\n💡 Tick数据加载失败，请检查CTP文件")
+                return
+        elif tick_store:
+            if not runner.load_data_from_tick_store(tick_store):
+                print("\n💡 Tick数据加载失败，请检查Parquet存储")
+                return
+        elif not runner.load_data_from_database():
             print("\n💡 Tick数据加载失败，请检查数据库")
             print("提示：确保您已经上传了Tick数据到数据库")
             print(f"     合约代码: {vt_symbol}")
@@ -621,6 +736,10 @@ def main():
     parser.add_argument('--symbol', type=str, help='交易品种，例如: IF2401.CFFEX')
     parser.add_argument('--start', type=str, help='开始时间，格式: YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS')
     parser.add_argument('--end', type=str, help='结束时间，格式: YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS')
+    parser.add_argument('--ctp-files', type=str, nargs='+', default=None,
+                        help='CTP格式的Tick CSV文件，Tick回测直接从文件回放，不经过数据库')
+    parser.add_argument('--tick-store', type=str, default=None,
+                        help='预处理生成的Parquet存储目录，Tick回测直接从存储加载，不经过数据库')
 
     args = parser.parse_args()
 
@@ -645,7 +764,7 @@ def main():
         run_bar_backtest(args.mode, args.symbol, start_date, end_date)
 
     if args.mode in ['tick', 'both']:
-        run_tick_backtest(args.mode, args.symbol, start_date, end_date)
+        run_tick_backtest(args.mode, args.symbol, start_date, end_date, args.ctp_files, args.tick_store)
 
 
 if __name__ == "__main__":
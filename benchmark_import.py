@@ -0,0 +1,427 @@
+"""
+benchmark_import.py
+导入吞吐基准测试
+
+- 用固定随机种子生成合成CFFEX数据：CTP格式五档Tick（含"29:00.1"这类小时≥24的跨日时间）、
+  完整时间戳的五档Tick、中文表头的分钟Bar
+- 分别运行CFFEXTickDataImporterFixed、CtpTickConverter、CFFEXMinuteBarImporter，
+  每个导入器在独立子进程和独立的临时SQLite数据库中运行，互不影响峰值内存
+- 输出每秒行数、峰值RSS以及各阶段（读取、解析、去重、保存）耗时，结果保存为JSON，
+  可与之前提交的结果对比发现性能回退
+
+用法:
+    python benchmark_import.py --rows 200000 --output bench_new.json
+    python benchmark_import.py --rows 200000 --output bench_new.json --compare bench_old.json
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 合成数据中的合约及其基准价格
+SYMBOL_PRICES = {
+    'IF2401': 3400.0,
+    'IH2401': 2400.0,
+    'IC2401': 5200.0,
+    'IM2401': 5600.0,
+}
+
+# 参与基准测试的导入器
+BENCHMARKS = ['tick_import', 'tick_import_bulk', 'ctp_convert', 'bar_import', 'bar_import_bulk']
+
+# 包含在其他阶段之内的子阶段（parse_datetime属于parse，build_ticks属于save）
+NESTED_STAGES = {'parse_datetime', 'build_ticks'}
+
+
+def generate_ctp_tick_csv(file_path: Path, rows: int, seed: int = 0, trading_day: str = '20240102',
+                          overflow_ratio: float = 0.05) -> Path:
+    """
+    生成CTP格式的五档Tick数据（CtpTickConverter的输入）
+
+    UpdateTime为CTP导出的"小时:分钟.秒"短格式，overflow_ratio比例的行使用小时≥24的
+    跨日时间（如"29:00.1"）。ClosePrice、SettlementPrice等盘中为空的字段留空，
+    否则convert_tick_row会设置数据表中不存在的属性导致写库失败
+    """
+    rng = np.random.default_rng(seed)
+    symbols = list(SYMBOL_PRICES)
+    codes = rng.integers(0, len(symbols), rows)
+    symbol = np.array(symbols)[codes]
+    base = np.array([SYMBOL_PRICES[s] for s in symbols])[codes]
+
+    # 日盘9-14点，跨日部分24-29点，按时间排序
+    overflow = rng.random(rows) < overflow_ratio
+    hours = np.where(overflow, rng.integers(24, 30, rows), rng.integers(9, 15, rows))
+    minutes = rng.integers(0, 60, rows)
+    tenths = rng.integers(0, 10, rows)
+    order = np.lexsort((tenths, minutes, hours))
+    hours, minutes, tenths = hours[order], minutes[order], tenths[order]
+
+    update_time = pd.Series(hours.astype(str)) + ':' + pd.Series(minutes).map('{:02d}'.format) \
+        + '.' + pd.Series(tenths.astype(str))
+
+    last = np.round(base + rng.normal(0, 5, rows), 1)
+    df = pd.DataFrame({
+        'TradingDay': trading_day,
+        'InstrumentID': symbol,
+        'ExchangeID': 'CFFEX',
+        'LastPrice': last,
+        'PreSettlementPrice': np.nan,
+        'PreClosePrice': base,
+        'PreOpenInterest': np.nan,
+        'OpenPrice': base,
+        'HighPrice': base + 20,
+        'LowPrice': base - 20,
+        'Volume': np.cumsum(rng.integers(0, 20, rows)),
+        'Turnover': np.round(np.cumsum(rng.integers(0, 20, rows)) * last * 300, 1),
+        'OpenInterest': rng.integers(100000, 120000, rows),
+        'ClosePrice': np.nan,
+        'SettlementPrice': np.nan,
+        'UpperLimitPrice': np.round(base * 1.1, 1),
+        'LowerLimitPrice': np.round(base * 0.9, 1),
+        'PreDelta': np.nan,
+        'CurrDelta': np.nan,
+        'UpdateTime': update_time,
+    })
+
+    for level in range(1, 6):
+        df[f'BidPrice{level}'] = np.round(last - 0.2 * level, 1)
+        df[f'BidVolume{level}'] = rng.integers(1, 50, rows)
+        df[f'AskPrice{level}'] = np.round(last + 0.2 * level, 1)
+        df[f'AskVolume{level}'] = rng.integers(1, 50, rows)
+
+    df['AveragePrice'] = np.nan
+    df['ActionDay'] = trading_day
+
+    df.to_csv(file_path, index=False)
+    return file_path
+
+
+def generate_tick_csv(file_path: Path, rows: int, seed: int = 0, duplicate_ratio: float = 0.01) -> Path:
+    """
+    生成完整时间戳的五档Tick数据（CFFEXTickDataImporterFixed的输入）
+
+    duplicate_ratio比例的行重复上一行的合约和时间，用于覆盖去重阶段
+    """
+    rng = np.random.default_rng(seed)
+    symbols = list(SYMBOL_PRICES)
+    codes = rng.integers(0, len(symbols), rows)
+    symbol = np.array(symbols)[codes]
+    base = np.array([SYMBOL_PRICES[s] for s in symbols])[codes]
+
+    start = np.datetime64('2024-01-02T09:30:00')
+    offsets = np.sort(rng.integers(0, 4 * 3600 * 1000, rows)).astype('timedelta64[ms]')
+    update_time = pd.Series(start + offsets).dt.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3]
+
+    duplicated = np.flatnonzero(rng.random(rows) < duplicate_ratio)
+    duplicated = duplicated[duplicated > 0]
+    symbol[duplicated] = symbol[duplicated - 1]
+    update_time.iloc[duplicated] = update_time.iloc[duplicated - 1].to_numpy()
+
+    last = np.round(base + rng.normal(0, 5, rows), 1)
+    df = pd.DataFrame({
+        'InstrumentID': symbol,
+        'UpdateTime': update_time,
+        'LastPrice': last,
+        'Volume': np.cumsum(rng.integers(0, 20, rows)),
+        'Turnover': np.round(np.cumsum(rng.integers(0, 20, rows)) * last * 300, 1),
+        'OpenInterest': rng.integers(100000, 120000, rows),
+        'UpperLimitPrice': np.round(base * 1.1, 1),
+        'LowerLimitPrice': np.round(base * 0.9, 1),
+        'PreClosePrice': base,
+        'OpenPrice': base,
+        'HighPrice': base + 20,
+        'LowPrice': base - 20,
+    })
+
+    for level in range(1, 6):
+        df[f'BidPrice{level}'] = np.round(last - 0.2 * level, 1)
+        df[f'BidVolume{level}'] = rng.integers(1, 50, rows)
+        df[f'AskPrice{level}'] = np.round(last + 0.2 * level, 1)
+        df[f'AskVolume{level}'] = rng.integers(1, 50, rows)
+
+    df.to_csv(file_path, index=False)
+    return file_path
+
+
+def generate_minute_bar_csv(file_path: Path, rows: int, seed: int = 0, encoding: str = 'gbk') -> Path:
+    """
+    生成中文表头的分钟Bar数据（CFFEXMinuteBarImporter的输入）
+
+    默认使用GBK编码，导入器先尝试UTF-8失败后再用GBK，覆盖编码重试的开销
+    """
+    rng = np.random.default_rng(seed)
+    symbols = list(SYMBOL_PRICES)
+    per_symbol = max(rows // len(symbols), 1)
+
+    # 每天9:30-11:30、13:00-15:00共240根
+    days = pd.bdate_range('2024-01-02', periods=per_symbol // 240 + 1)
+    minutes = np.concatenate([np.arange(571, 691), np.arange(781, 901)])
+    times = (days.values[:, None] + minutes[None, :].astype('timedelta64[m]')).ravel()[:per_symbol]
+    time_text = pd.Series(times).dt.strftime('%Y-%m-%d %H:%M:%S')
+
+    frames = []
+    for symbol in symbols:
+        base = SYMBOL_PRICES[symbol]
+        close = np.round(base + np.cumsum(rng.normal(0, 1, len(times))), 1)
+        volume = rng.integers(0, 500, len(times))
+        frames.append(pd.DataFrame({
+            '时间': time_text,
+            '开盘价': np.round(close + rng.normal(0, 0.5, len(times)), 1),
+            '最高价': close + 1.0,
+            '最低价': close - 1.0,
+            '收盘价': close,
+            '成交量': volume,
+            '成交额': np.round(volume * close * 300, 1),
+            '持仓量': rng.integers(100000, 120000, len(times)),
+            '合约代码': symbol,
+        }))
+
+    pd.concat(frames, ignore_index=True).to_csv(file_path, index=False, encoding=encoding)
+    return file_path
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    """当前进程的峰值RSS（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    if sys.platform == 'darwin':
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+def run_tick_import(file_path: Path, bulk: bool = False) -> Dict:
+    """运行CFFEXTickDataImporterFixed.import_file"""
+    from upload_cffex_tick_data import CFFEXTickDataImporterFixed
+
+    importer = CFFEXTickDataImporterFixed(bulk=bulk)
+    stats = importer.import_file(file_path)
+    return {'error': stats.get('error'), 'saved': stats.get('saved_ticks', 0), 'metrics': stats.get('metrics')}
+
+
+def run_ctp_convert(file_path: Path) -> Dict:
+    """运行CtpTickConverter.convert_csv_file"""
+    from convert_cpt_tick_to_vnpy import CtpTickConverter
+
+    converter = CtpTickConverter()
+    ticks = converter.convert_csv_file(str(file_path), symbol_filter=None)
+    return {'error': None, 'saved': len(ticks), 'metrics': converter.metrics.to_dict()}
+
+
+def run_bar_import(file_path: Path, bulk: bool = False) -> Dict:
+    """运行CFFEXMinuteBarImporter.import_data"""
+    from upload_cffex_minute_bars import CFFEXMinuteBarImporter
+
+    importer = CFFEXMinuteBarImporter(str(file_path), bulk=bulk)
+    stats = importer.import_data()
+    return {'error': None, 'saved': stats.get('saved_bars', 0), 'metrics': stats.get('metrics')}
+
+
+def run_one(name: str, file_path: Path) -> Dict:
+    """
+    在当前进程中运行一个基准，返回结果字典
+
+    由run_benchmark在子进程中调用，子进程的工作目录下已创建.vntrader，
+    vn.py因此使用该目录下的临时SQLite数据库。各阶段耗时取自导入器自身的
+    分阶段统计（import_metrics），嵌套阶段不计入other
+    """
+    rows = sum(1 for _ in open(file_path, 'rb')) - 1
+
+    start = time.perf_counter()
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, redirect_stdout(devnull):
+        if name == 'tick_import':
+            outcome = run_tick_import(file_path)
+        elif name == 'tick_import_bulk':
+            outcome = run_tick_import(file_path, bulk=True)
+        elif name == 'ctp_convert':
+            outcome = run_ctp_convert(file_path)
+        elif name == 'bar_import':
+            outcome = run_bar_import(file_path)
+        elif name == 'bar_import_bulk':
+            outcome = run_bar_import(file_path, bulk=True)
+        else:
+            raise ValueError(f"未知的基准: {name}")
+    seconds = time.perf_counter() - start
+
+    metrics = outcome['metrics'] or {'stages': {}, 'histograms': {}, 'rejects': {}}
+    stages = {stage: round(value['seconds'], 4) for stage, value in metrics['stages'].items()}
+    # 后台写库时save在写入线程中与其他阶段重叠，主线程的耗时记为save_wait
+    nested = NESTED_STAGES | ({'save'} if 'save_wait' in stages else set())
+    top_level = sum(value for stage, value in stages.items() if stage not in nested)
+    stages['other'] = round(max(seconds - top_level, 0.0), 4)
+
+    return {
+        'name': name,
+        'file': file_path.name,
+        'rows': rows,
+        'saved': outcome['saved'],
+        'error': outcome['error'],
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds, 1) if seconds else None,
+        'peak_rss_mb': get_peak_rss_mb(),
+        'stages': stages,
+        'batch_commit': metrics['histograms'].get('batch_commit'),
+        'rejects': metrics['rejects'],
+    }
+
+
+def run_benchmark(name: str, file_path: Path, work_dir: Path) -> Dict:
+    """在独立子进程和独立临时数据库中运行一个基准"""
+    run_dir = work_dir / name
+    (run_dir / '.vntrader').mkdir(parents=True, exist_ok=True)
+
+    result = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), '--run-one', name, '--file', str(file_path)],
+        cwd=run_dir, capture_output=True, text=True, encoding='utf-8'
+    )
+    if result.returncode != 0:
+        return {'name': name, 'file': file_path.name, 'error': result.stderr.strip()[-2000:]}
+
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def get_commit() -> Optional[str]:
+    """当前代码的git提交，不在git仓库中时返回None"""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent,
+                                capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def compare_results(baseline: Dict, current: Dict, tolerance: float = 0.1) -> List[str]:
+    """
+    与基准结果对比每秒行数，返回低于基准超过tolerance比例的基准名称
+    """
+    baseline_rates = {r['name']: r.get('rows_per_sec') for r in baseline['results']}
+    regressions = []
+
+    print(f"\n与 {baseline.get('commit')} 对比:")
+    if baseline.get('rows') != current.get('rows'):
+        print(f"  ⚠️  行数不同（{baseline.get('rows')} vs {current.get('rows')}），结果仅供参考")
+    for result in current['results']:
+        old, new = baseline_rates.get(result['name']), result.get('rows_per_sec')
+        if not old or not new:
+            continue
+
+        ratio = new / old
+        flag = ""
+        if ratio < 1 - tolerance:
+            flag = "  ⚠️  性能回退"
+            regressions.append(result['name'])
+        print(f"  {result['name']:<18} {old:>12.1f} → {new:>12.1f} 行/秒 ({ratio:.2f}x){flag}")
+
+    return regressions
+
+
+def print_results(report: Dict) -> None:
+    """打印基准测试结果"""
+    print("\n" + "=" * 60)
+    print("📊 导入基准测试结果")
+    print("=" * 60)
+
+    for result in report['results']:
+        if result.get('error') and 'seconds' not in result:
+            print(f"❌ {result['name']}: {result['error']}")
+            continue
+
+        rss = f"{result['peak_rss_mb']:.1f} MB" if result['peak_rss_mb'] is not None else "-"
+        print(f"{result['name']}: {result['rows']} 行, {result['seconds']:.2f} 秒, "
+              f"{result['rows_per_sec']:.1f} 行/秒, 峰值RSS {rss}, 保存 {result['saved']}")
+        print("  " + ", ".join(f"{stage}: {seconds:.3f}s" for stage, seconds in result['stages'].items()))
+        if result.get('error'):
+            print(f"  ⚠️  {result['error']}")
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='CFFEX数据导入吞吐基准测试')
+    parser.add_argument('--rows', type=int, default=100000, help='每个合成文件的行数')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据随机种子')
+    parser.add_argument('--only', type=str, nargs='+', choices=BENCHMARKS, help='只运行指定的基准')
+    parser.add_argument('--output', type=str, default=None, help='结果JSON文件路径')
+    parser.add_argument('--compare', type=str, default=None, help='与之前的结果JSON对比，回退时返回非0')
+    parser.add_argument('--data-dir', type=str, default=None, help='合成数据和临时数据库目录（默认临时目录，运行后删除）')
+    parser.add_argument('--run-one', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--file', type=str, default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    # 子进程：运行单个基准，最后一行输出JSON
+    if args.run_one:
+        print(json.dumps(run_one(args.run_one, Path(args.file)), ensure_ascii=False))
+        return
+
+    temp_dir = None
+    if args.data_dir:
+        work_dir = Path(args.data_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+    else:
+        temp_dir = tempfile.TemporaryDirectory(prefix='vnpy_import_bench_')
+        work_dir = Path(temp_dir.name)
+
+    try:
+        print(f"生成合成数据: {args.rows} 行, seed={args.seed}, 目录: {work_dir}")
+        files = {
+            'tick': generate_tick_csv(work_dir / 'tick.csv', args.rows, args.seed),
+            'ctp': generate_ctp_tick_csv(work_dir / 'ctp_tick.csv', args.rows, args.seed),
+            'bar': generate_minute_bar_csv(work_dir / 'minute_bar.csv', args.rows, args.seed),
+        }
+        inputs = {
+            'tick_import': files['tick'],
+            'tick_import_bulk': files['tick'],
+            'ctp_convert': files['ctp'],
+            'bar_import': files['bar'],
+            'bar_import_bulk': files['bar'],
+        }
+
+        report = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': get_commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'rows': args.rows,
+            'seed': args.seed,
+            'results': [],
+        }
+
+        for name in args.only or BENCHMARKS:
+            print(f"运行: {name}")
+            report['results'].append(run_benchmark(name, inputs[name], work_dir))
+
+        print_results(report)
+
+        if args.output:
+            Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+            print(f"\n结果已保存: {args.output}")
+
+        if args.compare:
+            baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+            if compare_results(baseline, report):
+                sys.exit(1)
+
+    finally:
+        if temp_dir:
+            temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
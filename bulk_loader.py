@@ -0,0 +1,234 @@
+"""
+bulk_loader.py
+批量写入：不构造TickData/BarData对象，直接把解析好的列数据写入vnpy_sqlite的数据表
+
+- 表结构与vnpy_sqlite的DbTickData/DbBarData一致，写入后vn.py其他模块可以正常读取
+- 唯一性语义与save_tick_data/save_bar_data相同：按(symbol, exchange[, interval], datetime)
+  INSERT OR REPLACE，同一键后写入的覆盖先写入的
+- 时间与convert_tz相同：无时区的时间视为本地时间，转换到数据库时区后去掉时区信息
+- 每次调用在一个事务中executemany写入，并按合约更新汇总表
+- 已存在数据查询只读取datetime一列（唯一索引覆盖，不回表），不构造BarData
+"""
+from datetime import datetime
+from itertools import repeat
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from tzlocal import get_localzone_name
+from vnpy.trader.constant import Exchange, Interval
+from vnpy.trader.database import BaseDatabase, DB_TZ
+
+
+class SqliteBulkLoader:
+    """vnpy_sqlite批量写入器"""
+
+    def __init__(self, database: BaseDatabase):
+        """
+        Args:
+            database: get_database()返回的数据库对象，必须是vnpy_sqlite
+        """
+        if not self.is_supported(database):
+            raise ValueError(f"批量写入仅支持vnpy_sqlite数据库，当前为: {type(database).__name__}")
+
+        from vnpy_sqlite.sqlite_database import DbBarData, DbBarOverview, DbTickData, DbTickOverview
+
+        self.db = database.db
+        self.tick_model = DbTickData
+        self.bar_model = DbBarData
+        self.tick_overview_model = DbTickOverview
+        self.bar_overview_model = DbBarOverview
+
+        self.tick_columns = self.get_columns(DbTickData)
+        self.bar_columns = self.get_columns(DbBarData)
+        self.tick_sql = self.get_insert_sql(DbTickData, self.tick_columns)
+        self.bar_sql = self.get_insert_sql(DbBarData, self.bar_columns)
+
+    @staticmethod
+    def is_supported(database: BaseDatabase) -> bool:
+        """判断数据库是否为vnpy_sqlite"""
+        try:
+            from vnpy_sqlite.sqlite_database import SqliteDatabase
+        except ImportError:
+            return False
+        return isinstance(database, SqliteDatabase)
+
+    @staticmethod
+    def get_columns(model) -> List[str]:
+        """数据表中除自增id外的列名"""
+        return [name for name in model._meta.sorted_field_names if name != 'id']
+
+    @staticmethod
+    def get_insert_sql(model, columns: List[str]) -> str:
+        """与peewee的insert_many(...).on_conflict_replace()等价的SQL"""
+        names = ', '.join(f'"{name}"' for name in columns)
+        marks = ', '.join('?' for _ in columns)
+        return f'INSERT OR REPLACE INTO "{model._meta.table_name}" ({names}) VALUES ({marks})'
+
+    @staticmethod
+    def to_db_time(datetimes: pd.Series) -> pd.Series:
+        """按convert_tz的规则转换为数据库时区的无时区时间"""
+        if datetimes.dt.tz is None:
+            local_name = get_localzone_name()
+            if local_name == DB_TZ.key:
+                return datetimes
+            datetimes = datetimes.dt.tz_localize(local_name, ambiguous='NaT', nonexistent='shift_forward')
+        return datetimes.dt.tz_convert(DB_TZ).dt.tz_localize(None)
+
+    @staticmethod
+    def format_db_time(datetimes: pd.Series) -> List[str]:
+        """
+        格式化为sqlite3默认适配器写入的字符串（datetime.isoformat(' ')），
+        微秒为0时不带小数部分，保证与save_xxx_data写入的值可以相互覆盖
+        """
+        text = np.datetime_as_string(datetimes.to_numpy(dtype='datetime64[us]'), unit='us')
+        text = pd.Series(text, dtype=object).str.replace('T', ' ', regex=False)
+        whole = text.str.endswith('.000000')
+        text[whole] = text[whole].str[:-7]
+        return text.tolist()
+
+    def build_rows(self, frame: pd.DataFrame, columns: List[str], constants: Dict[str, object]):
+        """按数据表列顺序生成executemany的参数行"""
+        datetimes = self.to_db_time(frame['datetime'])
+
+        values = []
+        for name in columns:
+            if name in constants:
+                values.append(repeat(constants[name]))
+            elif name == 'datetime':
+                values.append(self.format_db_time(datetimes))
+            elif name == 'symbol':
+                values.append(frame['symbol'].tolist())
+            elif name == 'name':
+                values.append(frame['name'].tolist() if 'name' in frame else repeat(""))
+            elif name == 'localtime':
+                values.append(repeat(None))
+            elif name in frame:
+                values.append(frame[name].astype(float).tolist())
+            else:
+                # TickData/BarData中数值字段的默认值均为0
+                values.append(repeat(0.0))
+
+        return zip(*values), datetimes
+
+    def save_tick_frame(self, frame: pd.DataFrame, exchange: Exchange) -> int:
+        """
+        批量保存Tick数据
+
+        Args:
+            frame: 包含symbol、datetime列以及TickData数值字段同名列的DataFrame，可以包含多个合约
+            exchange: 交易所
+
+        Returns:
+            写入的行数
+        """
+        if frame.empty:
+            return 0
+
+        rows, datetimes = self.build_rows(frame, self.tick_columns, {'exchange': exchange.value})
+
+        with self.db.atomic():
+            self.db.cursor().executemany(self.tick_sql, rows)
+            self.update_overview(frame['symbol'], datetimes, exchange)
+
+        return len(frame)
+
+    def save_bar_frame(self, frame: pd.DataFrame, exchange: Exchange, interval: Interval) -> int:
+        """
+        批量保存K线数据
+
+        Args:
+            frame: 包含symbol、datetime列以及BarData数值字段同名列的DataFrame，可以包含多个合约
+            exchange: 交易所
+            interval: K线周期
+
+        Returns:
+            写入的行数
+        """
+        if frame.empty:
+            return 0
+
+        constants = {'exchange': exchange.value, 'interval': interval.value}
+        rows, datetimes = self.build_rows(frame, self.bar_columns, constants)
+
+        with self.db.atomic():
+            self.db.cursor().executemany(self.bar_sql, rows)
+            self.update_overview(frame['symbol'], datetimes, exchange, interval)
+
+        return len(frame)
+
+    def update_overview(self, symbols: pd.Series, datetimes: pd.Series,
+                        exchange: Exchange, interval: Interval = None) -> None:
+        """按合约更新汇总表：起止时间取并集，数量按数据表重新统计"""
+        ranges = datetimes.groupby(symbols.to_numpy(), sort=False).agg(['min', 'max'])
+
+        for symbol, (start, end) in ranges.iterrows():
+            start, end = start.to_pydatetime(), end.to_pydatetime()
+
+            if interval is None:
+                model, data_model = self.tick_overview_model, self.tick_model
+                conditions = [model.symbol == symbol, model.exchange == exchange.value]
+                data_conditions = [data_model.symbol == symbol, data_model.exchange == exchange.value]
+            else:
+                model, data_model = self.bar_overview_model, self.bar_model
+                conditions = [
+                    model.symbol == symbol,
+                    model.exchange == exchange.value,
+                    model.interval == interval.value,
+                ]
+                data_conditions = [
+                    data_model.symbol == symbol,
+                    data_model.exchange == exchange.value,
+                    data_model.interval == interval.value,
+                ]
+
+            overview = model.get_or_none(*conditions)
+            if not overview:
+                overview = model()
+                overview.symbol = symbol
+                overview.exchange = exchange.value
+                if interval is not None:
+                    overview.interval = interval.value
+                overview.start = start
+                overview.end = end
+            else:
+                overview.start = min(start, overview.start)
+                overview.end = max(end, overview.end)
+
+            overview.count = data_model.select().where(*data_conditions).count()
+            overview.save()
+
+    def load_bar_times(self, symbol: str, exchange: Exchange, interval: Interval,
+                       start: datetime, end: datetime) -> np.ndarray:
+        """
+        查询start到end（都包含）之间已存在的K线时间
+
+        先按汇总表判断：汇总的时间范围与查询范围不重叠时不查数据表（没有汇总记录时照常查询）。
+        只读取datetime列，(symbol, exchange, interval, datetime)唯一索引即可满足查询
+
+        Returns:
+            数据库时区下无时区时间的datetime64[us]数组，按时间排序
+        """
+        bounds = self.to_db_time(pd.Series([start, end]))
+        lower, upper = bounds.min(), bounds.max()
+
+        model = self.bar_overview_model
+        overview = model.get_or_none(
+            model.symbol == symbol,
+            model.exchange == exchange.value,
+            model.interval == interval.value,
+        )
+        if overview and (overview.end < lower or overview.start > upper):
+            return np.array([], dtype='datetime64[us]')
+
+        # datetime列保存为isoformat(' ')字符串，同一格式下按字符串比较即按时间比较
+        lower_text, upper_text = self.format_db_time(pd.Series([lower, upper]))
+        table = self.bar_model._meta.table_name
+        cursor = self.db.execute_sql(
+            f'SELECT "datetime" FROM "{table}" '
+            f'WHERE "symbol" = ? AND "exchange" = ? AND "interval" = ? '
+            f'AND "datetime" >= ? AND "datetime" <= ? ORDER BY "datetime"',
+            (symbol, exchange.value, interval.value, lower_text, upper_text),
+        )
+        times = [row[0] for row in cursor.fetchall()]
+        return pd.to_datetime(pd.Series(times, dtype=object), format='ISO8601').to_numpy(dtype='datetime64[us]')
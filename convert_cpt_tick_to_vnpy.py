@@ -2,20 +2,40 @@
 convert_ctp_tick_to_vnpy.py
 将CTP格式的五档Tick数据转换为vn.py格式
 """
+import heapq
+import numpy as np
 import pandas as pd
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
+from itertools import islice, repeat
+from operator import attrgetter
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
 from vnpy.trader.constant import Exchange
 from vnpy.trader.object import TickData
 from vnpy.trader.database import BaseDatabase, get_database
 
+from import_metrics import ImportMetrics, format_stages, write_metrics_log
+from import_utils import csv_input, expand_csv_sources, iter_csv_chunks
+from tick_batch import TickBatch
+from tick_quality import failing_symbols, print_quality_report, profile_ticks, write_quality_report
+
 
 class CtpTickConverter:
     """CTP Tick数据转换器"""
 
-    def __init__(self):
+    def __init__(self, metrics_log: Optional[str] = None):
+        """
+        Args:
+            metrics_log: 每次转换结束后追加写入分阶段统计的JSON-lines日志，None表示不写
+        """
         # 初始化数据库
         self.database: BaseDatabase = get_database()
 
+        # 最近一次convert_csv_file的分阶段统计
+        self.metrics: Optional[ImportMetrics] = None
+        self.metrics_log = metrics_log
+
         # CTP与vn.py字段映射
         self.field_mapping = {
             'InstrumentID': 'symbol',
@@ -68,6 +88,44 @@ class CtpTickConverter:
             'AskVolume5': 'ask_volume_5',
         }
 
+        # TickData构造参数对应的CTP数值字段
+        self.tick_fields = {
+            'Volume': 'volume',
+            'Turnover': 'turnover',
+            'OpenInterest': 'open_interest',
+            'LastPrice': 'last_price',
+            'UpperLimitPrice': 'limit_up',
+            'LowerLimitPrice': 'limit_down',
+            'OpenPrice': 'open_price',
+            'HighPrice': 'high_price',
+            'LowPrice': 'low_price',
+            'PreClosePrice': 'pre_close',
+            **self.bid_mapping,
+            **self.ask_mapping,
+        }
+
+        # 通过setattr设置的可选字段（vn.py的TickData没有这些字段）
+        self.optional_fields = {
+            'ClosePrice': 'close_price',
+            'SettlementPrice': 'settlement_price',
+            'PreSettlementPrice': 'pre_settlement_price',
+            'AveragePrice': 'average_price',
+            'PreOpenInterest': 'pre_open_interest',
+            'CurrDelta': 'curr_delta',
+            'PreDelta': 'pre_delta',
+        }
+
+        # 类型化读取的列类型：合约代码为category，日期时间保持字符串（由parse_ctp_times解析），
+        # 五档挂单量为float32，其余映射字段（价格、成交量、成交额、持仓量）为float64
+        self.column_dtypes = {
+            'InstrumentID': 'category',
+            'UpdateTime': str,
+            'ActionDay': str,
+            'TradingDay': str,
+            **{name: 'float32' for name in self.bid_mapping if 'Volume' in name},
+            **{name: 'float32' for name in self.ask_mapping if 'Volume' in name},
+        }
+
     def parse_ctp_time(self, date_str: str, time_str: str) -> datetime:
         """
         解析CTP的时间格式（直接解析版）
@@ -162,7 +220,6 @@ class CtpTickConverter:
 
                 # 4. 调整日期
                 if extra_days > 0:
-                    from datetime import timedelta
                     base_date = datetime(year, month, day)
                     adjusted_date = base_date + timedelta(days=extra_days)
                     year, month, day = adjusted_date.year, adjusted_date.month, adjusted_date.day
@@ -176,19 +233,167 @@ class CtpTickConverter:
             traceback.print_exc()
             return datetime.now()
 
-    def convert_tick_row(self, row: pd.Series, exchange: Exchange = Exchange.CFFEX) -> TickData:
-        """转换单行数据为TickData对象 - vn.py 4.2版本"""
+    @staticmethod
+    def parse_ctp_date(date_str: str) -> Optional[datetime]:
+        """按parse_ctp_time的规则解析日期，parse_ctp_time会退回当前日期或报错的格式返回None"""
+        try:
+            if len(date_str) == 8:  # YYYYMMDD
+                return datetime(int(date_str[:4]), int(date_str[4:6]), int(date_str[6:8]))
+
+            for fmt in ["%Y-%m-%d", "%Y/%m/%d", "%Y%m%d"]:
+                try:
+                    return datetime.strptime(date_str, fmt)
+                except ValueError:
+                    continue
+        except ValueError:
+            pass
+
+        return None
+
+    @staticmethod
+    def split_ctp_times(times: pd.Series, width: int = 16) -> Dict[str, np.ndarray]:
+        """
+        把时间字符串按":"和"."拆成最多4组数字，全部用NumPy整列运算完成
+
+        字符串转为定长UCS4数组后逐列（最多width列）扫描，每列对所有行做一次数组运算
+
+        Returns:
+            包含各组数值、位数、分隔符、第3组前3位数字、第4组有效数字的字典，
+            ok为False的行含有其他字符、超长或超过4组
+        """
+        n = len(times)
+        text = np.array(times.to_numpy(dtype=object), dtype=f'U{width + 1}')
+        codes = text.view(np.uint32).reshape(n, width + 1)
+
+        groups = np.zeros(n, dtype=np.int64)
+        values = np.zeros((n, 4), dtype=np.int64)
+        counts = np.zeros((n, 4), dtype=np.int64)
+        seps = np.zeros((n, 3), dtype=np.uint32)
+        fraction = np.zeros((n, 3), dtype=np.int64)     # 第3组的前3位数字（"H:MM.S"格式）
+        sig_value = np.zeros(n, dtype=np.int64)         # 第4组去掉前导0后的前3位
+        sig_count = np.zeros(n, dtype=np.int64)         # 第4组去掉前导0后的位数
+        ok = codes[:, width] == 0                       # 超长的字符串被截断，交给逐行解析
+
+        for j in range(width):
+            c = codes[:, j]
+            if not c.any():
+                break
+
+            digit = (c >= 48) & (c <= 57)
+            sep = (c == 58) | (c == 46)
+            ok &= digit | sep | (c == 0)
+
+            rows = np.flatnonzero(digit)
+            g = groups[rows]
+            d = c[rows].astype(np.int64) - 48
+            values[rows, g] = values[rows, g] * 10 + d
+            pos = counts[rows, g]
+            counts[rows, g] = pos + 1
+
+            third = (g == 2) & (pos < 3)
+            fraction[rows[third], pos[third]] = d[third]
+
+            fourth = (g == 3) & ((sig_count[rows] > 0) | (d > 0))
+            r = rows[fourth]
+            head = sig_count[r] < 3
+            sig_value[r[head]] = sig_value[r[head]] * 10 + d[fourth][head]
+            sig_count[r] += 1
+
+            rows = np.flatnonzero(sep)
+            ok[rows[groups[rows] >= 3]] = False
+            rows = rows[groups[rows] < 3]
+            seps[rows, groups[rows]] = c[rows]
+            groups[rows] += 1
+
+        # 时/分/秒位数过多时可能溢出，交给逐行解析
+        ok &= (counts[:, :3] <= 4).all(axis=1)
+
+        return {
+            'ok': ok, 'groups': groups, 'values': values, 'counts': counts, 'seps': seps,
+            'fraction': fraction, 'sig_value': sig_value, 'sig_count': sig_count,
+        }
+
+    def parse_ctp_times(self, dates: pd.Series, times: pd.Series) -> pd.Series:
+        """
+        列式解析CTP时间，结果与逐行调用parse_ctp_time完全相同（包括小时≥24的跨日）
+
+        - 日期列通常只有一两个不同的值，按唯一值解析后展开
+        - 时间列用split_ctp_times整列拆分后做整数运算，批量处理两种常见格式：
+          "H:MM.S"（小数部分补齐3位后第1位为秒、第2~3位为毫秒）和
+          "H:MM[:SS[.fff]]"（毫秒按去掉前导0后的位数补齐，"5"和"05"均为500）
+        - 其余格式的行（空值、首尾空格、分钟/秒越界等）逐行调用parse_ctp_time
+
+        Args:
+            dates: ActionDay/TradingDay列
+            times: UpdateTime列
+
+        Returns:
+            与输入同索引的时间列
+        """
+        # 1. 日期
+        date_codes, date_uniques = pd.factorize(dates, use_na_sentinel=False)
+        parsed = [self.parse_ctp_date(str(value)) for value in date_uniques]
+        days = np.array([np.datetime64(d, 'us') if d else np.datetime64('NaT', 'us') for d in parsed],
+                        dtype='datetime64[us]')[date_codes]
+
+        # 2. 时间
+        parts = self.split_ctp_times(times)
+        groups, values, counts, seps = parts['groups'], parts['values'], parts['counts'], parts['seps']
+        colon, dot = ord(':'), ord('.')
+        hour_minute = (counts[:, 0] > 0) & (counts[:, 1] > 0) & (seps[:, 0] == colon)
+
+        # "H:MM.S"：恰好一个冒号和一个点
+        short = hour_minute & (groups == 2) & (seps[:, 1] == dot)
+
+        # "H:MM"、"H:MM:SS"、"H:MM:SS.fff"
+        full = hour_minute & (
+            (groups == 1)
+            | ((groups == 2) & (seps[:, 1] == colon) & (counts[:, 2] > 0))
+            | ((groups == 3) & (seps[:, 1] == colon) & (seps[:, 2] == dot)
+               & (counts[:, 2] > 0) & (counts[:, 3] > 0))
+        )
+
+        fraction, sig_value, sig_count = parts['fraction'], parts['sig_value'], parts['sig_count']
+        seconds = np.where(short, fraction[:, 0], values[:, 2])
+        full_ms = np.where(sig_count <= 1, sig_value * 100, np.where(sig_count == 2, sig_value * 10, sig_value))
+        milliseconds = np.where(short, fraction[:, 1] * 10 + fraction[:, 2], full_ms)
+        hours, minutes = values[:, 0], values[:, 1]
+
+        # 3. 小时≥24时整除24的部分计入日期，按总微秒数叠加即可
+        offsets = ((hours * 60 + minutes) * 60 + seconds) * 1_000_000 + milliseconds * 1000
+        result = days + offsets.astype('timedelta64[us]')
+
+        # 4. 批量规则覆盖不到的行逐行解析
+        fast = parts['ok'] & (short | full) & (minutes < 60) & (seconds < 60) & ~np.isnat(days)
+        slow = np.flatnonzero(~fast)
+        for i in slow:
+            result[i] = self.parse_ctp_time(str(dates.iloc[i]), str(times.iloc[i]))
+
+        if self.metrics and len(slow):
+            self.metrics.count('datetime_fallbacks', len(slow))
+
+        return pd.Series(result, index=dates.index)
+
+    def convert_tick_row(self, row: pd.Series, exchange: Exchange = Exchange.CFFEX,
+                         datetime_obj: Optional[datetime] = None) -> TickData:
+        """
+        转换单行数据为TickData对象 - vn.py 4.2版本
+
+        datetime_obj为parse_ctp_times预先解析的时间，None时逐行解析
+        """
 
         # 解析基础字段
         symbol = str(row.get('InstrumentID', ''))
-        date_str = str(row.get('ActionDay', row.get('TradingDay', '')))
-        time_str = str(row.get('UpdateTime', '00:00:00'))
 
-        # 调试输出原始时间
-        if hasattr(self, 'debug_mode') and self.debug_mode:
-            print(f"原始: date={date_str}, time={time_str}")
+        if datetime_obj is None:
+            date_str = str(row.get('ActionDay', row.get('TradingDay', '')))
+            time_str = str(row.get('UpdateTime', '00:00:00'))
 
-        datetime_obj = self.parse_ctp_time(date_str, time_str)
+            # 调试输出原始时间
+            if hasattr(self, 'debug_mode') and self.debug_mode:
+                print(f"原始: date={date_str}, time={time_str}")
+
+            datetime_obj = self.parse_ctp_time(date_str, time_str)
 
         # 调试输出解析结果
         if hasattr(self, 'debug_mode') and self.debug_mode:
@@ -265,17 +470,7 @@ class CtpTickConverter:
         tick.vt_symbol = f"{tick.symbol}.{exchange.value}"
 
         # 设置可选字段（通过setattr，因为这些不在构造函数中）
-        optional_fields = {
-            'ClosePrice': 'close_price',  # 注意：vn.py没有这个字段，但我们可以添加
-            'SettlementPrice': 'settlement_price',
-            'PreSettlementPrice': 'pre_settlement_price',
-            'AveragePrice': 'average_price',
-            'PreOpenInterest': 'pre_open_interest',
-            'CurrDelta': 'curr_delta',
-            'PreDelta': 'pre_delta',
-        }
-
-        for ctp_field, attr_name in optional_fields.items():
+        for ctp_field, attr_name in self.optional_fields.items():
             value = get_float(ctp_field)
             if value != 0:
                 try:
@@ -286,50 +481,478 @@ class CtpTickConverter:
 
         return tick
 
-    def convert_csv_file(self, file_path: str, symbol_filter: str = None,
+    def frame_to_ticks(self, df: pd.DataFrame, datetimes: np.ndarray,
+                       exchange: Exchange = Exchange.CFFEX, progress: bool = True) -> list:
+        """
+        由类型化读取的DataFrame整列取值构造TickData，结果与逐行convert_tick_row相同
+
+        数值列一次性转为float列表，缺失值按0处理（与get_float的默认值相同）
+        """
+        def column(field):
+            if field not in df.columns:
+                return repeat(0)
+            return df[field].to_numpy(dtype='float64', na_value=0).tolist()
+
+        if 'InstrumentID' in df.columns:
+            symbols = df['InstrumentID'].astype(object).map(str).tolist()
+        else:
+            symbols = repeat('')
+
+        names = list(self.tick_fields.values())
+        values = zip(*[column(field) for field in self.tick_fields])
+        optional = [
+            (attr_name, column(ctp_field))
+            for ctp_field, attr_name in self.optional_fields.items()
+            if ctp_field in df.columns
+        ]
+
+        ticks = []
+        for i, (symbol, datetime_obj, row) in enumerate(zip(symbols, datetimes, values)):
+            tick = TickData(
+                gateway_name="CTP",
+                symbol=symbol,
+                exchange=exchange,
+                datetime=datetime_obj,
+                name="",
+                last_volume=0,
+                localtime=None,
+                **dict(zip(names, row)),
+            )
+            tick.vt_symbol = f"{tick.symbol}.{exchange.value}"
+
+            for attr_name, column_values in optional:
+                if column_values[i] != 0:
+                    setattr(tick, attr_name, column_values[i])
+
+            ticks.append(tick)
+
+            if progress and (i + 1) % 10000 == 0:
+                print(f"已转换 {i + 1}/{len(df)} 行")
+
+        return ticks
+
+    def is_typed(self, df: pd.DataFrame) -> bool:
+        """数值字段均已是数值类型时可以整列构造TickData"""
+        return all(
+            pd.api.types.is_numeric_dtype(df[field])
+            for field in list(self.tick_fields) + list(self.optional_fields)
+            if field in df.columns
+        )
+
+    @staticmethod
+    def match_symbols(symbols: pd.Series, symbol_filter: Union[str, Iterable[str]]) -> pd.Series:
+        """
+        合约过滤条件
+
+        Args:
+            symbols: InstrumentID列
+            symbol_filter: 含数字的字符串为单个合约（如"IF2401"）；纯字母为品种代码
+                （如"IF"匹配IF的所有合约，"T"只匹配T而不匹配TF、TS、TL）；集合或列表为多个合约
+        """
+        if isinstance(symbol_filter, str):
+            if symbol_filter.isalpha():
+                # 品种代码为合约代码开头的字母部分，按品种代码完整比较
+                products = symbols.astype(str).str.extract(r'^([A-Za-z]+)', expand=False)
+                return (products == symbol_filter).fillna(False).astype(bool)
+            return symbols == symbol_filter
+        return symbols.isin(set(symbol_filter))
+
+    def iter_ctp_chunks(self, file_path: str, symbol_filter: Union[str, Iterable[str], None] = None,
+                        typed: bool = True, chunk_size: int = 200_000) -> Iterator[Tuple[pd.DataFrame, int]]:
+        """
+        分块读取CTP文件并在每块内按合约过滤
+
+        .gz/.zst文件边解压边读取；zip压缩包中的多个CSV（如每个交易日一个文件）
+        按文件名顺序依次读取，相当于一个文件
+
+        Yields:
+            (过滤后的分块, 该分块过滤前的行数)
+        """
+        if self.metrics is None:
+            self.metrics = ImportMetrics()
+        metrics = self.metrics
+        offset = 0
+        for source in expand_csv_sources([file_path]):
+            if typed:
+                with csv_input(source) as header_source:
+                    header = pd.read_csv(header_source, nrows=0).columns
+                mapped = set(self.field_mapping) | set(self.bid_mapping) | set(self.ask_mapping)
+                usecols = [name for name in header if name in mapped]
+                dtype = {name: self.column_dtypes.get(name, 'float64') for name in usecols}
+                reader = iter_csv_chunks(source, chunk_size, usecols=usecols, dtype=dtype)
+            else:
+                reader = iter_csv_chunks(source, chunk_size, dtype=str)  # 全部以字符串读取，避免类型问题
+
+            for chunk in metrics.timed_iter('read', reader):
+                rows = len(chunk)
+                # 多个文件的行号接续编号，与读取单个文件一致
+                if offset:
+                    chunk.index = chunk.index + offset
+                offset += rows
+                if symbol_filter:
+                    with metrics.stage('filter', rows):
+                        chunk = chunk[self.match_symbols(chunk['InstrumentID'], symbol_filter)]
+                yield chunk, rows
+
+    def iter_frames(self, file_path: str, symbol_filter: Union[str, Iterable[str], None] = None,
+                    start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    chunk_size: int = 10_000) -> Iterator[Tuple[pd.DataFrame, pd.Series]]:
+        """
+        逐块读取单个文件，解析时间并按时间范围过滤，每块内按时间排序
+
+        文件本身必须按时间顺序排列（CTP导出文件均如此）：每块内排序只能纠正块内的乱序，
+        后一块出现早于前一块的时间时无法保证回放顺序，直接报错
+
+        Yields:
+            (分块, 对应的时间列)
+
+        Raises:
+            ValueError: 分块之间时间倒退
+        """
+        metrics = self.metrics
+        last = None
+
+        for chunk, _ in self.iter_ctp_chunks(file_path, symbol_filter, chunk_size=chunk_size):
+            with metrics.stage('parse_datetime', len(chunk)):
+                datetimes = self.get_datetime_column(chunk)
+
+            # 合约代码为空的行不回放（与drop_missing_symbols相同）；起止时间与load_tick_data相同，都包含在内
+            missing = chunk['InstrumentID'].isna().to_numpy()
+            if missing.any():
+                metrics.reject('no_symbol', int(missing.sum()))
+            mask = ~missing
+            if start is not None:
+                mask = mask & (datetimes >= start).to_numpy()
+            if end is not None:
+                mask = mask & (datetimes <= end).to_numpy()
+
+            order = np.argsort(datetimes.to_numpy()[mask], kind='stable')
+            positions = np.flatnonzero(mask)[order]
+            if not len(positions):
+                continue
+            chunk, datetimes = chunk.iloc[positions], datetimes.iloc[positions]
+
+            if last is not None and datetimes.iloc[0] < last:
+                raise ValueError(f"{file_path} 中的数据没有按时间排序（{datetimes.iloc[0]} 早于 {last}），"
+                                 f"无法按时间顺序流式回放，请先转换入库后从数据库回测")
+            last = datetimes.iloc[-1]
+
+            yield chunk, datetimes
+
+    def iter_ticks(self, file_paths: Union[str, Iterable[str]],
+                   symbol_filter: Union[str, Iterable[str], None] = None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   exchange: Exchange = Exchange.CFFEX, chunk_size: int = 10_000) -> Iterator[TickData]:
+        """
+        从一个或多个CTP文件按时间顺序惰性生成TickData，不经过数据库
+
+        每个文件逐块读取和转换，多个文件按时间归并，内存占用只与分块大小和文件数有关。
+        每个文件本身必须按时间排序，否则抛出ValueError（见iter_frames）
+
+        Args:
+            file_paths: CSV文件路径或路径列表（如多个交易日的文件）
+            symbol_filter: 只生成匹配的合约，规则同convert_csv_file
+            start: 开始时间（包含），None表示不限
+            end: 结束时间（包含），None表示不限
+            exchange: 交易所
+            chunk_size: 每次读取的行数
+        """
+        if isinstance(file_paths, (str, Path)):
+            file_paths = [file_paths]
+        if self.metrics is None:
+            self.metrics = ImportMetrics()
+
+        streams = [
+            self.iter_file_ticks(str(path), symbol_filter, start, end, exchange, chunk_size)
+            for path in file_paths
+        ]
+        if len(streams) == 1:
+            yield from streams[0]
+        else:
+            yield from heapq.merge(*streams, key=attrgetter('datetime'))
+
+    def iter_file_ticks(self, file_path: str, symbol_filter: Union[str, Iterable[str], None],
+                        start: Optional[datetime], end: Optional[datetime],
+                        exchange: Exchange, chunk_size: int) -> Iterator[TickData]:
+        """逐块生成单个文件的TickData"""
+        for chunk, datetimes in self.iter_frames(file_path, symbol_filter, start, end, chunk_size):
+            ticks, _ = self.convert_frame(chunk, self.get_datetimes(chunk, datetimes), exchange, progress=False)
+            yield from ticks
+
+    def count_ticks(self, file_paths: Union[str, Iterable[str]],
+                    symbol_filter: Union[str, Iterable[str], None] = None,
+                    start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    chunk_size: int = 10_000) -> int:
+        """统计iter_ticks将生成的Tick数量（只解析时间，不构造TickData）"""
+        if isinstance(file_paths, (str, Path)):
+            file_paths = [file_paths]
+        if self.metrics is None:
+            self.metrics = ImportMetrics()
+
+        return sum(
+            len(chunk)
+            for path in file_paths
+            for chunk, _ in self.iter_frames(str(path), symbol_filter, start, end, chunk_size)
+        )
+
+    def read_ctp_csv(self, file_path: str, symbol_filter: Union[str, Iterable[str], None] = None,
+                     typed: bool = True, chunk_size: int = 200_000) -> Tuple[pd.DataFrame, int]:
+        """
+        分块读取CTP文件，合约过滤在每块内完成，峰值内存与匹配的行数成正比
+
+        typed为True时只读取转换用到的列，并按column_dtypes指定类型，与全部按字符串读取相比
+        内存占用小得多，数值列也不需要逐格转换
+
+        Returns:
+            (过滤后的DataFrame（保留原文件中的行号作为索引）, 读取的总行数)
+
+        Raises:
+            ValueError: 类型化读取时数值列含有无法解析的内容
+        """
+        chunks = []
+        total_rows = 0
+        for chunk, rows in self.iter_ctp_chunks(file_path, symbol_filter, typed, chunk_size):
+            total_rows += rows
+            chunks.append(chunk)
+
+        df = pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+        if typed and 'InstrumentID' in df.columns:
+            # 各分块的类别不同，合并后重新转为category
+            df['InstrumentID'] = df['InstrumentID'].astype('category')
+        return df, total_rows
+
+    def load_csv(self, file_path: str, symbol_filter: Union[str, Iterable[str], None] = None,
+                 typed: bool = True) -> Tuple[pd.DataFrame, int]:
+        """读取CTP文件，类型化读取失败时退回按字符串读取"""
+        if typed:
+            try:
+                return self.read_ctp_csv(file_path, symbol_filter)
+            except ValueError as e:
+                print(f"类型化读取失败，改为按字符串读取: {e}")
+                self.metrics.count('typed_read_fallbacks')
+        return self.read_ctp_csv(file_path, symbol_filter, typed=False)
+
+    def convert_csv_file(self, file_path: str, symbol_filter: Union[str, Iterable[str], None] = None,
                          exchange: Exchange = Exchange.CFFEX,
-                         save_to_db: bool = True) -> list:
+                         save_to_db: bool = True, typed: bool = True) -> list:
         """
         转换整个CSV文件
 
         Args:
             file_path: CSV文件路径
-            symbol_filter: 只转换特定合约（如"IF2401"），None表示所有
+            symbol_filter: 只转换特定合约，None表示所有。可以是单个合约（如"IF2401"）、
+                品种前缀（如"IF"）或合约集合，在分块读取时过滤
             exchange: 交易所
             save_to_db: 是否保存到数据库
+            typed: 类型化读取并整列构造TickData；False时全部按字符串读取后逐行转换。
+                数值列含有无法解析的内容时自动退回字符串读取
         """
         print(f"读取文件: {file_path}")
+        metrics = self.metrics = ImportMetrics()
 
         # 读取CSV文件
         try:
-            df = pd.read_csv(file_path, dtype=str)  # 全部以字符串读取，避免类型问题
+            df, total_rows = self.load_csv(file_path, symbol_filter, typed)
         except Exception as e:
             print(f"读取文件失败: {e}")
+            self.finish_metrics(file_path, error=str(e))
             return []
 
-        print(f"原始数据行数: {len(df)}")
-
-        # 过滤特定合约
+        print(f"原始数据行数: {total_rows}")
         if symbol_filter:
-            df = df[df['InstrumentID'] == symbol_filter]
             print(f"过滤后数据行数 ({symbol_filter}): {len(df)}")
+        print(f"内存占用: {df.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB")
+
+        df = self.drop_missing_symbols(df)
 
         if len(df) == 0:
             print("没有符合条件的数据")
+            self.finish_metrics(file_path, rows=0, converted=0, saved=0)
             return []
 
         # 转换数据
+        print("开始转换数据...")
+        with metrics.stage('parse', len(df)):
+            # 先整列解析时间，再构造TickData
+            with metrics.stage('parse_datetime', len(df)):
+                datetimes = self.get_datetimes(df)
+
+            ticks, errors = self.convert_frame(df, datetimes, exchange)
+
+        print(f"转换完成: 成功 {len(ticks)} 条，失败 {len(errors)} 条")
+        metrics.reject('convert_error', len(errors))
+
+        if errors:
+            print(f"前10个错误: {errors[:10]}")
+
+        # 保存到数据库
+        saved = 0
+        error = None
+        if save_to_db and ticks:
+            print("保存到数据库...")
+            with metrics.stage('save', len(ticks)):
+                saved, error = self.save_ticks(ticks)
+
+            if error is None:
+                print(f"✅ 成功保存 {len(ticks)} 条Tick数据到数据库")
+
+        self.finish_metrics(file_path, error=error, rows=len(df), converted=len(ticks), saved=saved)
+        print(f"⏱️  {format_stages(metrics.to_dict())}")
+
+        return ticks
+
+    def read_tick_batch(self, file_path: str, symbol_filter: Union[str, Iterable[str], None] = None,
+                        exchange: Exchange = Exchange.CFFEX) -> TickBatch:
+        """
+        读取CTP文件为列式的TickBatch，不创建TickData对象
+
+        内存占用约为TickData列表的几分之一，适合把较长时间的Tick数据整体放在内存中。
+        可选字段（ClosePrice等）不在TickData中，不保存
+        """
+        self.metrics = ImportMetrics()
+        df, _ = self.read_ctp_csv(file_path, symbol_filter)
+        df = self.drop_missing_symbols(df)
+
+        with self.metrics.stage('parse', len(df)):
+            frame = pd.DataFrame({
+                'symbol': df['InstrumentID'],
+                'datetime': self.get_datetime_column(df),
+            }, index=df.index)
+            for ctp_field, attr_name in self.tick_fields.items():
+                if ctp_field in df.columns:
+                    frame[attr_name] = df[ctp_field]
+
+            return TickBatch.from_frame(frame, exchange, gateway_name="CTP")
+
+    def convert_csv_file_by_symbol(self, file_path: str,
+                                   symbol_filter: Union[str, Iterable[str], None] = None,
+                                   exchange: Exchange = Exchange.CFFEX,
+                                   save_to_db: bool = True, typed: bool = True) -> Dict[str, Dict]:
+        """
+        一次读取和解析文件，按合约分组后逐个合约转换并保存
+
+        文件只读取、解析时间各一次，每个合约的数据按时间排序后分批保存，
+        保证每批只含一个合约（save_tick_data按批次中的合约更新汇总表）。
+        转换好的TickData保存后即释放，不在内存中保留整个文件的对象
+
+        Args:
+            file_path: CSV文件路径
+            symbol_filter: 只转换匹配的合约，规则同convert_csv_file，None表示所有
+            exchange: 交易所
+            save_to_db: 是否保存到数据库
+            typed: 类型化读取，规则同convert_csv_file
+
+        Returns:
+            合约 -> {rows, converted, saved, errors, start, end, error}
+        """
+        print(f"读取文件: {file_path}")
+        metrics = self.metrics = ImportMetrics()
+
+        try:
+            df, total_rows = self.load_csv(file_path, symbol_filter, typed)
+        except Exception as e:
+            print(f"读取文件失败: {e}")
+            self.finish_metrics(file_path, error=str(e))
+            return {}
+
+        print(f"原始数据行数: {total_rows}，待转换行数: {len(df)}")
+
+        # 整个文件只解析一次时间，再按合约分组（合约代码为空的行无法保存）
+        rows = len(df)
+        with metrics.stage('parse_datetime', len(df)):
+            datetimes = self.get_datetime_column(df)
+
+        with metrics.stage('partition', len(df)):
+            df = self.drop_missing_symbols(df)
+            datetimes = datetimes.loc[df.index]
+            groups = df.groupby('InstrumentID', observed=True, sort=True).indices
+
+        results = {}
+        for symbol, positions in groups.items():
+            symbol = str(symbol)
+
+            with metrics.stage('parse', len(positions)):
+                # 按时间排序，同一时间的行保持文件中的先后顺序
+                positions = positions[np.argsort(datetimes.to_numpy()[positions], kind='stable')]
+                group = df.iloc[positions]
+                ticks, errors = self.convert_frame(group, self.get_datetimes(group, datetimes), exchange)
+            metrics.reject('convert_error', len(errors))
+
+            saved, error = 0, None
+            if save_to_db and ticks:
+                with metrics.stage('save', len(ticks)):
+                    saved, error = self.save_ticks(ticks)
+
+            results[symbol] = {
+                'rows': len(group),
+                'converted': len(ticks),
+                'saved': saved,
+                'errors': len(errors),
+                'start': ticks[0].datetime if ticks else None,
+                'end': ticks[-1].datetime if ticks else None,
+                'error': error,
+            }
+            print(f"{symbol}: 转换 {len(ticks)}/{len(group)} 条，保存 {saved} 条")
+
+        self.print_symbol_stats(results)
+        self.finish_metrics(
+            file_path,
+            rows=rows,
+            converted=sum(r['converted'] for r in results.values()),
+            saved=sum(r['saved'] for r in results.values()),
+            symbols=len(results),
+        )
+        print(f"⏱️  {format_stages(metrics.to_dict())}")
+
+        return results
+
+    def print_symbol_stats(self, results: Dict[str, Dict]) -> None:
+        """打印按合约转换的统计"""
+        print(f"\n📊 按合约统计 ({len(results)} 个合约):")
+        print(f"  {'合约':<10}{'行数':>10}{'转换':>10}{'保存':>10}  时间范围")
+        for symbol, result in results.items():
+            print(f"  {symbol:<10}{result['rows']:>10}{result['converted']:>10}{result['saved']:>10}  "
+                  f"{result['start']} ~ {result['end']}"
+                  + (f"  ❌ {result['error']}" if result['error'] else ""))
+
+    def drop_missing_symbols(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        去掉合约代码为空的行，计入no_symbol
+
+        这些行无法按合约保存，convert_csv_file、convert_csv_file_by_symbol、read_tick_batch
+        与iter_frames都不转换它们，保证入库和回放看到相同的数据
+        """
+        if 'InstrumentID' not in df.columns:
+            return df
+
+        missing = df['InstrumentID'].isna().to_numpy()
+        if missing.any():
+            self.metrics.reject('no_symbol', int(missing.sum()))
+            df = df[~missing]
+        return df
+
+    def convert_frame(self, df: pd.DataFrame, datetimes: np.ndarray,
+                      exchange: Exchange = Exchange.CFFEX, progress: bool = True) -> Tuple[list, list]:
+        """
+        把DataFrame转换为TickData列表
+
+        类型化读取的数据整列构造，按字符串读取的数据逐行转换，progress为False时不打印进度
+
+        Returns:
+            (TickData列表, [(行号, 错误信息)])
+        """
+        if self.is_typed(df):
+            return self.frame_to_ticks(df, datetimes, exchange, progress), []
+
         ticks = []
         errors = []
-
-        print("开始转换数据...")
-        for idx, row in df.iterrows():
+        for (idx, row), datetime_obj in zip(df.iterrows(), datetimes):
             try:
-                tick = self.convert_tick_row(row, exchange)
+                tick = self.convert_tick_row(row, exchange, datetime_obj)
                 ticks.append(tick)
 
                 # 进度显示
-                if (idx + 1) % 10000 == 0:
+                if progress and (idx + 1) % 10000 == 0:
                     print(f"已转换 {idx + 1}/{len(df)} 行")
 
             except Exception as e:
@@ -337,36 +960,73 @@ class CtpTickConverter:
                 if len(errors) <= 10:  # 只显示前10个错误
                     print(f"行 {idx} 转换失败: {e}")
 
-        print(f"转换完成: 成功 {len(ticks)} 条，失败 {len(errors)} 条")
+        return ticks, errors
 
-        if errors:
-            print(f"前10个错误: {errors[:10]}")
+    def save_ticks(self, ticks: list, batch_size: int = 10000) -> Tuple[int, Optional[str]]:
+        """
+        分批保存到数据库，避免内存问题
 
-        # 保存到数据库
-        if save_to_db and ticks:
-            print("保存到数据库...")
-            try:
-                # 分批保存，避免内存问题
-                batch_size = 10000
-                for i in range(0, len(ticks), batch_size):
-                    batch = ticks[i:i + batch_size]
-                    self.database.save_tick_data(batch)
-                    print(f"已保存 {min(i + batch_size, len(ticks))}/{len(ticks)} 条")
+        Returns:
+            (保存的条数, 错误信息)，保存失败时未保存的条数计入save_error
+        """
+        saved = 0
+        try:
+            for i in range(0, len(ticks), batch_size):
+                batch = ticks[i:i + batch_size]
+                start = perf_counter()
+                self.database.save_tick_data(batch)
+                self.metrics.observe('batch_commit', perf_counter() - start)
+                saved += len(batch)
+                print(f"已保存 {min(i + batch_size, len(ticks))}/{len(ticks)} 条")
 
-                print(f"✅ 成功保存 {len(ticks)} 条Tick数据到数据库")
+        except Exception as e:
+            print(f"❌ 保存到数据库失败: {e}")
+            import traceback
+            traceback.print_exc()
+            self.metrics.reject('save_error', len(ticks) - saved)
+            return saved, str(e)
 
-            except Exception as e:
-                print(f"❌ 保存到数据库失败: {e}")
-                import traceback
-                traceback.print_exc()
+        return saved, None
 
-        return ticks
+    def get_datetime_column(self, df: pd.DataFrame) -> pd.Series:
+        """按convert_tick_row的取列规则整列解析时间"""
+        if 'ActionDay' in df.columns:
+            dates = df['ActionDay']
+        elif 'TradingDay' in df.columns:
+            dates = df['TradingDay']
+        else:
+            dates = pd.Series('', index=df.index)
+        times = df['UpdateTime'] if 'UpdateTime' in df.columns else pd.Series('00:00:00', index=df.index)
+
+        return self.parse_ctp_times(dates, times)
+
+    def get_datetimes(self, df: pd.DataFrame, datetimes: Optional[pd.Series] = None) -> np.ndarray:
+        """
+        返回与df各行对应的datetime对象数组
+
+        datetimes为已解析的时间列（索引包含df的索引）时直接取值，否则整列解析
+        """
+        if datetimes is None:
+            datetimes = self.get_datetime_column(df)
+        else:
+            datetimes = datetimes.loc[df.index]
+        return datetimes.to_numpy(dtype='datetime64[us]').astype(object)
+
+    def finish_metrics(self, file_path: str, **fields) -> None:
+        """把本次转换的分阶段统计追加写入JSON-lines日志"""
+        write_metrics_log(self.metrics_log, {
+            'event': 'ctp_convert',
+            'file': str(file_path),
+            **fields,
+            **self.metrics.to_dict(),
+        })
 
     def preview_conversion(self, file_path: str, n_rows: int = 5):
         """预览转换结果"""
         print(f"预览前{n_rows}行转换结果:")
 
-        df = pd.read_csv(file_path, nrows=n_rows)
+        with csv_input(expand_csv_sources([file_path])[0]) as source:
+            df = pd.read_csv(source, nrows=n_rows)
 
         for idx, row in df.iterrows():
             try:
@@ -378,21 +1038,113 @@ class CtpTickConverter:
             except Exception as e:
                 print(f"行 {idx} 转换失败: {e}")
 
+
+class CtpTickStream:
+    """
+    CTP文件的惰性Tick序列，可以直接赋值给BacktestingEngine.history_data
+
+    run_backtesting通过len()取总数，再按顺序切片分批回放。切片返回惰性迭代器，
+    连续的切片共用同一个底层迭代器，因此整个回放过程只读取一遍文件，内存占用与数据量无关。
+    len()第一次调用时额外扫描一遍文件计数（只解析时间），文件没有按时间排序时在这一步报错。
+
+    读取位置按切片实际取出的条数推进；请求新切片后，之前的切片不再产生数据
+    """
+
+    def __init__(self, converter: CtpTickConverter, file_paths: Union[str, Iterable[str]], **kwargs):
+        """
+        Args:
+            converter: 转换器
+            file_paths: CSV文件路径或路径列表
+            kwargs: 传给CtpTickConverter.iter_ticks的过滤条件（symbol_filter、start、end等）
+        """
+        self.converter = converter
+        self.file_paths = [file_paths] if isinstance(file_paths, (str, Path)) else list(file_paths)
+        self.kwargs = kwargs
+
+        self.count: Optional[int] = None
+        self.cursor = 0
+        self.iterator: Optional[Iterator[TickData]] = None
+        self.active: Optional[object] = None
+
+    def __iter__(self) -> Iterator[TickData]:
+        return self.converter.iter_ticks(self.file_paths, **self.kwargs)
+
+    def __len__(self) -> int:
+        if self.count is None:
+            kwargs = {k: v for k, v in self.kwargs.items() if k != 'exchange'}
+            self.count = self.converter.count_ticks(self.file_paths, **kwargs)
+        return self.count
+
+    def __bool__(self) -> bool:
+        return next(iter(self), None) is not None
+
+    def take(self, token: object, size: Optional[int]) -> Iterator[TickData]:
+        """
+        从底层迭代器取出最多size条（None为取到末尾），每取出一条推进cursor
+
+        之后又请求了新切片时停止，不与新切片争用底层迭代器
+        """
+        iterator = self.iterator
+        while (size is None or size > 0) and self.active is token:
+            tick = next(iterator, None)
+            if tick is None:
+                # 底层迭代器用尽，下次切片从头读取
+                self.iterator = None
+                return
+
+            self.cursor += 1
+            if size is not None:
+                size -= 1
+            yield tick
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1) or (index.start or 0) < 0 or (index.stop or 0) < 0:
+                raise ValueError("CtpTickStream只支持非负、步长为1的切片")
+
+            start = index.start or 0
+            if self.iterator is None or start < self.cursor:
+                # 向前访问或上次已读到末尾时从头重新读取
+                self.iterator = iter(self)
+                self.cursor = 0
+            self.cursor += sum(1 for _ in islice(self.iterator, start - self.cursor))
+
+            size = None if index.stop is None else max(index.stop - start, 0)
+            self.active = token = object()
+            return self.take(token, size)
+
+        if index < 0:
+            index += len(self)
+        try:
+            return next(islice(iter(self), index, None))
+        except StopIteration:
+            raise IndexError("CtpTickStream index out of range") from None
+
+
 def main():
     """主函数"""
     import argparse
 
     parser = argparse.ArgumentParser(description='转换CTP Tick数据为vn.py格式')
-    parser.add_argument('--file', type=str, required=True, help='CSV文件路径')
-    parser.add_argument('--symbol', type=str, default='IF2401', help='合约代码（如IF2401）')
+    parser.add_argument('--file', type=str, required=True,
+                        help='CSV文件路径（支持.gz、.zst压缩文件和包含多个CSV的.zip压缩包）')
+    parser.add_argument('--symbol', type=str, default=None,
+                        help='合约代码（默认IF2401），多个合约用逗号分隔，纯字母表示品种前缀（如IF）')
+    parser.add_argument('--all-symbols', action='store_true',
+                        help='一次读取文件，按合约分组转换并保存所有合约（指定--symbol时只转换匹配的合约）')
     parser.add_argument('--exchange', type=str, default='CFFEX', help='交易所（默认CFFEX）')
     parser.add_argument('--preview', action='store_true', help='只预览不保存')
     parser.add_argument('--no-save', action='store_true', help='不保存到数据库')
+    parser.add_argument('--str-read', action='store_true', help='全部列按字符串读取后逐行转换（旧逻辑，默认类型化读取）')
+    parser.add_argument('--metrics-log', type=str, default=None, help='分阶段统计追加写入的JSON-lines日志文件')
+    parser.add_argument('--quality-report', type=str, default=None, help='数据质量报告写入的JSON文件')
+    parser.add_argument('--max-bad-ratio', type=float, default=None,
+                        help='质量门槛：任一合约问题Tick比例超过该值时不转换入库')
 
     args = parser.parse_args()
 
     # 创建转换器
-    converter = CtpTickConverter()
+    converter = CtpTickConverter(metrics_log=args.metrics_log)
 
     # 获取交易所
     try:
@@ -401,16 +1153,51 @@ def main():
         print(f"交易所 {args.exchange} 无效，使用默认CFFEX")
         exchange = Exchange.CFFEX
 
+    symbol_filter = args.symbol
+    if symbol_filter and ',' in symbol_filter:
+        symbol_filter = symbol_filter.split(',')
+
+    # 指定质量门槛或报告文件时，先用列式读取检查整个文件，不合格时不入库
+    report = None
+    if not args.preview and (args.quality_report or args.max_bad_ratio is not None):
+        if not args.all_symbols:
+            symbol_filter = symbol_filter or 'IF2401'
+        try:
+            batch = converter.read_tick_batch(args.file, symbol_filter, exchange)
+        except Exception as e:
+            print(f"❌ 数据质量检查失败: {e}")
+            return
+
+        report = profile_ticks(batch)
+        print_quality_report(report)
+        write_quality_report(args.quality_report, report)
+
+        if args.max_bad_ratio is not None:
+            failing = failing_symbols(report, args.max_bad_ratio)
+            if failing:
+                print(f"❌ 以下合约问题Tick比例超过 {args.max_bad_ratio:.4%}，不转换入库: {failing}")
+                return
+
     if args.preview:
         # 预览模式
         converter.preview_conversion(args.file)
+    elif args.all_symbols:
+        # 按合约分组转换
+        converter.convert_csv_file_by_symbol(
+            file_path=args.file,
+            symbol_filter=symbol_filter,
+            exchange=exchange,
+            save_to_db=not args.no_save,
+            typed=not args.str_read
+        )
     else:
         # 转换模式
         ticks = converter.convert_csv_file(
             file_path=args.file,
-            symbol_filter=args.symbol,
+            symbol_filter=symbol_filter or 'IF2401',
             exchange=exchange,
-            save_to_db=not args.no_save
+            save_to_db=not args.no_save,
+            typed=not args.str_read
         )
 
         if ticks:
@@ -421,20 +1208,12 @@ def main():
             print(f"  数据条数: {len(ticks)}")
             print(f"  合约代码: {ticks[0].symbol}")
 
-            # 检查数据质量
+            # 检查数据质量（整个数据集，按合约统计）
             symbols = set(t.symbol for t in ticks)
             print(f"  包含合约: {list(symbols)}")
 
-            # 时间间隔分析
-            if len(ticks) > 1:
-                intervals = []
-                for i in range(1, min(100, len(ticks))):
-                    interval = (ticks[i].datetime - ticks[i - 1].datetime).total_seconds()
-                    intervals.append(interval)
-
-                print(f"  平均间隔: {sum(intervals) / len(intervals):.3f}秒")
-                print(f"  最小间隔: {min(intervals):.3f}秒")
-                print(f"  最大间隔: {max(intervals):.3f}秒")
+            if report is None:
+                print_quality_report(profile_ticks(TickBatch.from_ticks(ticks)))
 
 
 
@@ -442,5 +1221,6 @@ if __name__ == "__main__":
     # 示例用法
     # python convert_ctp_tick_to_vnpy.py --file your_data.csv --symbol IF2401
     # python convert_ctp_tick_to_vnpy.py --file your_data.csv --preview
+    # python convert_ctp_tick_to_vnpy.py --file your_data.csv --all-symbols
 
     main()
\ No newline at end of file
@@ -0,0 +1,201 @@
+"""
+import_manifest.py
+导入清单：用SQLite旁路文件记录已导入的数据文件
+
+- 记录每个文件的路径、大小、修改时间、内容哈希、保存行数以及合约和时间范围
+- 重复运行时跳过内容未变化的文件
+- 记录每个合约已提交的批次进度，导入中途崩溃后从最后提交的批次继续
+"""
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from import_utils import ArchiveMember, as_source
+
+
+class ImportManifest:
+    """导入清单"""
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: 清单数据库文件路径
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # 后台写库线程会回调add_progress，因此允许跨线程使用同一连接
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.lock = Lock()
+
+        # 本次运行中已计算过的文件状态，避免重复计算哈希
+        self.file_states: Dict[str, Tuple[int, float, str]] = {}
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS imported_file (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER,
+                    mtime REAL,
+                    hash TEXT,
+                    status TEXT,
+                    saved_rows INTEGER,
+                    symbols TEXT,
+                    start TEXT,
+                    end TEXT,
+                    updated_at TEXT
+                )
+                """
+            )
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS import_progress (
+                    path TEXT,
+                    symbol TEXT,
+                    committed_rows INTEGER,
+                    saved_rows INTEGER,
+                    PRIMARY KEY (path, symbol)
+                )
+                """
+            )
+
+    @staticmethod
+    def file_key(file_path: Path) -> str:
+        """清单中使用的文件标识（绝对路径）"""
+        return str(as_source(file_path).resolve())
+
+    @staticmethod
+    def hash_file(file_path: Path, block_size: int = 1 << 20) -> str:
+        """计算文件内容哈希（zip压缩包中的文件按解压后的内容计算）"""
+        digest = hashlib.blake2b(digest_size=20)
+        with file_path.open() if isinstance(file_path, ArchiveMember) else open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def get_file_state(self, file_path: Path) -> Tuple[int, float, str]:
+        """返回文件的(大小, 修改时间, 内容哈希)"""
+        key = self.file_key(file_path)
+        stat = as_source(file_path).stat()
+
+        cached = self.file_states.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+            return cached
+
+        state = (stat.st_size, stat.st_mtime, self.hash_file(file_path))
+        self.file_states[key] = state
+        return state
+
+    def is_imported(self, file_path: Path) -> bool:
+        """
+        判断文件是否已完整导入且内容未变化
+
+        大小和修改时间都一致时直接判定未变化；否则计算内容哈希再比较，
+        只是被touch过的文件不会重新导入
+        """
+        key = self.file_key(file_path)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime, hash FROM imported_file WHERE path = ? AND status = 'done'", (key,)
+            ).fetchone()
+        if not row:
+            return False
+
+        stat = as_source(file_path).stat()
+        if row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return True
+
+        size, mtime, file_hash = self.get_file_state(file_path)
+        if file_hash != row[2]:
+            return False
+
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE imported_file SET mtime = ? WHERE path = ?", (mtime, key))
+        return True
+
+    def begin(self, file_path: Path) -> Dict[str, int]:
+        """
+        开始导入文件
+
+        如果上次导入同一内容的文件时中断，返回各合约已提交的行数用于续传；
+        文件内容变化或上次已完成时清空进度，返回空字典
+        """
+        key = self.file_key(file_path)
+        size, mtime, file_hash = self.get_file_state(file_path)
+
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT hash, status FROM imported_file WHERE path = ?", (key,)
+            ).fetchone()
+
+            if row and row[0] == file_hash and row[1] == 'running':
+                progress = self.conn.execute(
+                    "SELECT symbol, committed_rows FROM import_progress WHERE path = ?", (key,)
+                ).fetchall()
+                return dict(progress)
+
+            self.conn.execute("DELETE FROM import_progress WHERE path = ?", (key,))
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO imported_file
+                (path, size, mtime, hash, status, saved_rows, symbols, start, end, updated_at)
+                VALUES (?, ?, ?, ?, 'running', 0, '[]', NULL, NULL, ?)
+                """,
+                (key, size, mtime, file_hash, datetime.now().isoformat(timespec='seconds'))
+            )
+
+        return {}
+
+    def add_progress(self, file_path: Path, symbol: str, committed_rows: int, saved_rows: int) -> None:
+        """记录某合约又提交了一个批次（committed_rows含保存失败被拒绝的行）"""
+        key = self.file_key(file_path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO import_progress (path, symbol, committed_rows, saved_rows) VALUES (?, ?, ?, ?)
+                ON CONFLICT (path, symbol) DO UPDATE SET
+                    committed_rows = committed_rows + excluded.committed_rows,
+                    saved_rows = saved_rows + excluded.saved_rows
+                """,
+                (key, symbol, committed_rows, saved_rows)
+            )
+
+    def finish(self, file_path: Path, stats: Dict) -> None:
+        """标记文件导入完成，记录保存行数、合约列表和时间范围"""
+        key = self.file_key(file_path)
+        with self.lock, self.conn:
+            saved_rows = self.conn.execute(
+                "SELECT COALESCE(SUM(saved_rows), 0) FROM import_progress WHERE path = ?", (key,)
+            ).fetchone()[0]
+
+            self.conn.execute(
+                """
+                UPDATE imported_file
+                SET status = 'done', saved_rows = ?, symbols = ?, start = ?, end = ?, updated_at = ?
+                WHERE path = ?
+                """,
+                (
+                    max(saved_rows, stats.get('saved_ticks', 0)),
+                    json.dumps(sorted(stats.get('unique_symbols', []))),
+                    self.format_time(stats.get('start')),
+                    self.format_time(stats.get('end')),
+                    datetime.now().isoformat(timespec='seconds'),
+                    key,
+                )
+            )
+            self.conn.execute("DELETE FROM import_progress WHERE path = ?", (key,))
+
+    @staticmethod
+    def format_time(value: Optional[datetime]) -> Optional[str]:
+        """时间转为字符串保存"""
+        return str(value) if value is not None else None
+
+    def close(self) -> None:
+        """关闭清单数据库"""
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,625 @@
+"""
+import_utils.py
+Tick/Bar数据导入脚本共用的工具函数
+"""
+import codecs
+import csv
+import gzip
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+from enum import Enum
+from pathlib import Path, PurePosixPath
+from queue import Queue
+from threading import Lock, Thread
+from time import perf_counter
+from types import SimpleNamespace
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+
+# 边解压边读取的压缩格式（.zst需要zstandard）
+COMPRESSED_SUFFIXES = ('.gz', '.zst', '.zip')
+
+
+def infer_datetime_format(text: pd.Series, formats: List[str], sample_size: int = 1000) -> Optional[str]:
+    """
+    在样本上推断时间列的格式
+
+    从非空值中均匀抽取最多sample_size个样本（覆盖文件头尾），按优先级逐个
+    尝试候选格式，返回匹配行数最多的格式；都不匹配时返回None
+    """
+    text = text.dropna()
+    if text.empty:
+        return None
+
+    if len(text) > sample_size:
+        positions = np.linspace(0, len(text) - 1, sample_size).astype(int)
+        text = text.iloc[positions]
+
+    best_format = None
+    best_count = 0
+    for fmt in formats:
+        count = int(pd.to_datetime(text, format=fmt, errors='coerce').notna().sum())
+        if count > best_count:
+            best_format, best_count = fmt, count
+        if count == len(text):
+            break
+
+    return best_format
+
+
+def parse_datetime_column(values: pd.Series, formats: List[str],
+                          sample_size: int = 1000) -> Tuple[pd.Series, List[str]]:
+    """
+    按列解析时间字符串
+
+    先在样本上推断格式，再用该格式对整列做一次向量化解析。同一文件混有多种
+    格式时，对剩余未解析的行重新推断，直到样本中没有能匹配的格式为止。
+    非字符串、空值以及不匹配任何格式的行结果为NaT，由调用方放入拒绝桶，
+    不再逐行重试，也不再回退为只有日期的9:30
+
+    Returns:
+        (解析结果, 实际使用的格式列表)
+    """
+    # 只有字符串才参与解析
+    is_str = values.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    text = values.where(is_str).astype(object).str.strip()
+    text = text.where(text != '')
+
+    result = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+    pending = text.notna().to_numpy().copy()
+    candidates = list(formats)
+    used_formats = []
+
+    while pending.any() and candidates:
+        fmt = infer_datetime_format(text[pending], candidates, sample_size)
+        if fmt is None:
+            break
+        candidates.remove(fmt)
+        used_formats.append(fmt)
+
+        parsed = pd.to_datetime(text[pending], format=fmt, errors='coerce').to_numpy(dtype='datetime64[ns]')
+        matched = ~np.isnat(parsed)
+        positions = np.flatnonzero(pending)[matched]
+        result[positions] = parsed[matched]
+        pending[positions] = False
+
+    return pd.Series(result, index=values.index), used_formats
+
+
+class ArchiveMember:
+    """
+    zip压缩包中的一个CSV文件
+
+    提供导入器用到的Path接口（name、stem、suffix、parent、exists、stat、resolve），
+    可以和普通文件路径一样传给导入器和导入清单
+    """
+
+    def __init__(self, archive: Path, member: str):
+        """
+        Args:
+            archive: zip文件路径
+            member: 压缩包内的文件名
+        """
+        self.archive = Path(archive)
+        self.member = member
+
+    @property
+    def name(self) -> str:
+        return PurePosixPath(self.member).name
+
+    @property
+    def stem(self) -> str:
+        return PurePosixPath(self.member).stem
+
+    @property
+    def suffix(self) -> str:
+        return PurePosixPath(self.member).suffix
+
+    @property
+    def parent(self) -> Path:
+        return self.archive.parent
+
+    def exists(self) -> bool:
+        return self.archive.exists()
+
+    def resolve(self) -> "ArchiveMember":
+        return ArchiveMember(self.archive.resolve(), self.member)
+
+    def stat(self) -> SimpleNamespace:
+        """大小为解压后的大小，修改时间为压缩包的修改时间"""
+        with zipfile.ZipFile(self.archive) as archive:
+            size = archive.getinfo(self.member).file_size
+        return SimpleNamespace(st_size=size, st_mtime=self.archive.stat().st_mtime)
+
+    def open(self) -> BinaryIO:
+        """打开解压流，关闭时同时关闭压缩包"""
+        with zipfile.ZipFile(self.archive) as archive:
+            # 压缩包对象关闭后，已打开的成员在关闭前仍可读取
+            return archive.open(self.member)
+
+    def __str__(self) -> str:
+        return f"{self.archive}/{self.member}"
+
+    def __repr__(self) -> str:
+        return f"ArchiveMember({str(self.archive)!r}, {self.member!r})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ArchiveMember) and (self.archive, self.member) == (other.archive, other.member)
+
+    def __hash__(self) -> int:
+        return hash((self.archive, self.member))
+
+
+CsvSource = Union[Path, ArchiveMember]
+
+
+def as_source(file_path: Union[str, Path, ArchiveMember]) -> CsvSource:
+    """字符串转换为Path，ArchiveMember保持不变"""
+    return file_path if isinstance(file_path, ArchiveMember) else Path(file_path)
+
+
+def is_compressed(file_path: Union[str, Path, ArchiveMember]) -> bool:
+    """是否需要解压读取"""
+    source = as_source(file_path)
+    return isinstance(source, ArchiveMember) or source.suffix.lower() in COMPRESSED_SUFFIXES
+
+
+def is_csv_source(file_path: Union[str, Path]) -> bool:
+    """是否为CSV或压缩的CSV（.csv、.csv.gz、.csv.zst、.zip）"""
+    name = Path(file_path).name.lower()
+    return name.endswith(('.csv', '.csv.gz', '.csv.zst', '.zip'))
+
+
+def source_stem(file_path: Union[str, Path, ArchiveMember]) -> str:
+    """去掉.csv及压缩扩展名后的文件名，例如 20240102.csv.gz -> 20240102"""
+    name = as_source(file_path).name
+    for suffix in ('.gz', '.zst'):
+        if name.lower().endswith(suffix):
+            name = name[:-len(suffix)]
+    return name[:-len('.csv')] if name.lower().endswith('.csv') else Path(name).stem
+
+
+def expand_csv_sources(paths: Iterable[Union[str, Path, ArchiveMember]]) -> List[CsvSource]:
+    """
+    展开输入文件：zip压缩包展开为其中的CSV文件（按文件名排序，如按日期命名的多个交易日），
+    其他文件保持不变
+    """
+    sources = []
+    for path in paths:
+        source = as_source(path)
+        if isinstance(source, Path) and source.suffix.lower() == '.zip':
+            with zipfile.ZipFile(source) as archive:
+                members = sorted(
+                    info.filename for info in archive.infolist()
+                    if not info.is_dir() and info.filename.lower().endswith('.csv')
+                )
+            sources.extend(ArchiveMember(source, member) for member in members)
+        else:
+            sources.append(source)
+    return sources
+
+
+def list_csv_sources(directory: Path) -> List[CsvSource]:
+    """列出目录下的CSV文件（含.csv.gz、.csv.zst和zip压缩包中的CSV），按文件名排序"""
+    with os.scandir(directory) as entries:
+        paths = sorted(Path(e.path) for e in entries if e.is_file() and is_csv_source(e.name))
+    return expand_csv_sources(paths)
+
+
+def open_binary(file_path: Union[str, Path, ArchiveMember]) -> BinaryIO:
+    """以二进制方式打开文件，压缩文件返回边读取边解压的流"""
+    source = as_source(file_path)
+    if isinstance(source, ArchiveMember):
+        return source.open()
+
+    suffix = source.suffix.lower()
+    if suffix == '.gz':
+        return gzip.open(source, 'rb')
+    if suffix == '.zst':
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("读取.zst文件需要安装zstandard: pip install zstandard") from e
+        return zstandard.ZstdDecompressor().stream_reader(open(source, 'rb'), closefd=True)
+    if suffix == '.zip':
+        return expand_csv_sources([source])[0].open()
+    return open(source, 'rb')
+
+
+@contextmanager
+def csv_input(file_path: Union[str, Path, ArchiveMember]) -> Iterator[Union[Path, BinaryIO]]:
+    """
+    pd.read_csv的输入：普通文件和.gz/.zst文件传路径，由pandas边解压边读取；
+    zip成员传打开的解压流，退出时关闭
+    """
+    source = as_source(file_path)
+    if isinstance(source, ArchiveMember):
+        with source.open() as f:
+            yield f
+    else:
+        yield source
+
+
+def iter_csv_chunks(file_path: Union[str, Path, ArchiveMember], chunk_size: int,
+                    **kwargs) -> Iterator[pd.DataFrame]:
+    """按chunk_size行分块读取CSV（压缩文件边解压边读取），读完或生成器关闭时关闭文件"""
+    with csv_input(file_path) as source, pd.read_csv(source, chunksize=chunk_size, **kwargs) as reader:
+        yield from reader
+
+
+def detect_encoding(file_path: Path, encodings: List[str], block_size: int = 1 << 20) -> Optional[str]:
+    """
+    检测文件编码：按块增量解码整个文件，返回第一个能完整解码的候选编码
+
+    只解码不解析，内存占用与block_size相关，适合在分块读取前确定编码
+    """
+    for encoding in encodings:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open_binary(file_path) as f:
+                for block in iter(lambda: f.read(block_size), b''):
+                    decoder.decode(block)
+                decoder.decode(b'', final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+
+    return None
+
+
+def sniff_encoding(file_path: Path, encodings: List[str], sample_size: int = 1 << 16) -> Optional[str]:
+    """
+    抽样检测文件编码：只解码文件头部和尾部各sample_size字节
+
+    尾部样本从第一个换行之后开始，避免从多字节字符中间截断；带UTF-8 BOM的文件
+    直接返回utf-8-sig。返回第一个能解码两段样本的候选编码，都不能解码时返回None。
+    压缩文件无法直接跳到尾部，只抽样头部
+    """
+    compressed = is_compressed(file_path)
+    with open_binary(file_path) as f:
+        head = f.read(sample_size)
+        size = len(head) + len(f.read(1)) if compressed else f.seek(0, 2)
+
+        tail = b''
+        if size > sample_size and not compressed:
+            f.seek(max(size - sample_size, sample_size))
+            tail = f.read()
+            newline = tail.find(b'\n')
+            tail = tail[newline + 1:] if newline >= 0 else b''
+
+    if head.startswith(codecs.BOM_UTF8) and 'utf-8-sig' in encodings:
+        return 'utf-8-sig'
+
+    for encoding in encodings:
+        try:
+            # 头部样本可能在多字节字符中间截断，整个文件都读完时才要求完整
+            codecs.getincrementaldecoder(encoding)().decode(head, final=size <= sample_size)
+            if tail:
+                codecs.getincrementaldecoder(encoding)().decode(tail, final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+
+    return None
+
+
+# 严格编码：非对应编码的字节几乎不可能解码成功，始终最先尝试
+STRICT_ENCODINGS = ('utf-8', 'utf-8-sig')
+
+
+class EncodingCache:
+    """
+    按目录缓存文件编码
+
+    同一批供应商数据通常编码一致，同一目录下的文件优先尝试上一个文件的编码。
+    缓存只调整宽松编码（gbk、gb2312等）之间的顺序：GBK能无错解码部分UTF-8字节序列，
+    如果把缓存的GBK排在utf-8之前，UTF-8文件会被读成乱码而不报错
+    """
+
+    def __init__(self, encodings: List[str]):
+        """
+        Args:
+            encodings: 候选编码，按优先级排列
+        """
+        self.encodings = list(encodings)
+        self.by_dir: Dict[str, str] = {}
+        self.lock = Lock()
+
+    def get(self, file_path: Path) -> Optional[str]:
+        """返回文件所在目录缓存的编码"""
+        return self.by_dir.get(str(as_source(file_path).parent))
+
+    def candidates(self, file_path: Path) -> List[str]:
+        """返回候选编码：严格编码在前，所在目录已缓存的宽松编码排在其余宽松编码之前"""
+        strict = [encoding for encoding in self.encodings if encoding in STRICT_ENCODINGS]
+        lenient = [encoding for encoding in self.encodings if encoding not in STRICT_ENCODINGS]
+
+        cached = self.get(file_path)
+        if cached in lenient:
+            lenient = [cached] + [encoding for encoding in lenient if encoding != cached]
+        return strict + lenient
+
+    def ordered(self, file_path: Path) -> List[str]:
+        """返回候选编码，抽样检测出的编码排在最前，通常只需完整解码一遍"""
+        candidates = self.candidates(file_path)
+        sniffed = sniff_encoding(file_path, candidates)
+        if not sniffed:
+            return candidates
+        return [sniffed] + [encoding for encoding in candidates if encoding != sniffed]
+
+    def remember(self, file_path: Path, encoding: str) -> None:
+        """记录文件实际使用的编码"""
+        with self.lock:
+            self.by_dir[str(as_source(file_path).parent)] = encoding
+
+
+def read_csv_encodings(file_path: Path, encodings: List[str], metrics=None,
+                       **kwargs) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+    """
+    依次用候选编码读取CSV，返回第一个能完整解码的结果
+
+    解码失败的重试次数计入metrics的encoding_retries
+
+    Returns:
+        (DataFrame, 使用的编码)，所有候选编码都失败时为(None, None)
+    """
+    for encoding in encodings:
+        try:
+            with csv_input(file_path) as source:
+                df = pd.read_csv(source, encoding=encoding, **kwargs)
+        except UnicodeDecodeError:
+            if metrics:
+                metrics.count('encoding_retries')
+            continue
+        return df, encoding
+
+    return None, None
+
+
+def read_csv_sniffed(file_path: Path, cache: EncodingCache, metrics=None,
+                     **kwargs) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+    """
+    抽样检测编码后只读取一次CSV
+
+    样本没有覆盖到的部分解码失败时，才依次用其余候选编码重新读取
+
+    Returns:
+        (DataFrame, 使用的编码)，所有候选编码都失败时为(None, None)
+    """
+    df, encoding = read_csv_encodings(file_path, cache.ordered(file_path), metrics, **kwargs)
+    if encoding:
+        cache.remember(file_path, encoding)
+    return df, encoding
+
+
+class ChunkDeduplicator:
+    """
+    跨分块的(symbol, datetime)去重器，保留首次出现的行
+
+    每个合约只保存已出现时间戳的int64有序数组（按分块存放并记录时间区间），
+    新分块只与时间区间重叠的历史分块比较，按时间顺序写入的数据几乎没有比较开销
+    """
+
+    def __init__(self):
+        self.blocks: Dict[str, List[Tuple[int, int, np.ndarray]]] = {}
+
+    def dedupe(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """返回frame中(symbol, datetime)此前未出现过的行"""
+        frame = frame.drop_duplicates(subset=['symbol', 'datetime'], keep='first')
+        if frame.empty:
+            return frame
+
+        keys = frame['datetime'].to_numpy(dtype='datetime64[ns]').view('int64')
+        keep = np.ones(len(frame), dtype=bool)
+
+        for symbol, positions in frame.groupby('symbol', sort=False).indices.items():
+            symbol_keys = keys[positions]
+            low, high = int(symbol_keys.min()), int(symbol_keys.max())
+            blocks = self.blocks.setdefault(symbol, [])
+
+            for block_low, block_high, block_keys in blocks:
+                if block_high < low or block_low > high:
+                    continue
+                duplicated = np.isin(symbol_keys, block_keys, assume_unique=True)
+                keep[positions[duplicated]] = False
+
+            new_keys = np.sort(symbol_keys[keep[positions]])
+            if len(new_keys):
+                blocks.append((int(new_keys[0]), int(new_keys[-1]), new_keys))
+
+        return frame[keep]
+
+
+class BackgroundWriter:
+    """
+    后台写库线程
+
+    解析方通过submit()把待保存的批次放入有界队列，由专门的线程调用save_func写入数据库，
+    解析下一批与提交上一批同时进行；队列满时submit阻塞，写入跟不上时自动对解析方施加背压。
+
+    随批次传入metrics时，写入线程把实际写库耗时记入该metrics的save阶段；
+    解析方提交时的等待由调用方记为save_wait阶段
+    """
+
+    def __init__(self, save_func: Callable[[list], int], max_pending: int = 4):
+        """
+        Args:
+            save_func: 保存一个批次并返回成功条数的函数
+            max_pending: 队列中最多等待写入的批次数
+        """
+        self.save_func = save_func
+        self.queue: Queue = Queue(maxsize=max_pending)
+        self.saved = 0
+        self.error: Optional[BaseException] = None
+
+        self.thread = Thread(target=self.run, name="BackgroundWriter", daemon=True)
+        self.thread.start()
+
+    def submit(self, records: list, on_saved: Optional[Callable[[int], None]] = None,
+               metrics=None, rows: Optional[int] = None) -> None:
+        """
+        提交一个批次，on_saved在写入线程中以成功条数回调
+
+        Args:
+            records: 交给save_func的批次
+            on_saved: 写入完成后的回调
+            metrics: 记录写库耗时的ImportMetrics，None表示不记录
+            rows: 计入save阶段的行数，None时取len(records)
+        """
+        if self.error:
+            raise RuntimeError(f"后台写入失败: {self.error}") from self.error
+        self.queue.put((records, on_saved, metrics, rows))
+
+    def run(self) -> None:
+        """写入线程主循环，收到None时退出"""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            records, on_saved, metrics, rows = item
+            if self.error:
+                continue
+
+            try:
+                start = perf_counter()
+                count = self.save_func(records)
+                if metrics is not None:
+                    metrics.add_stage('save', perf_counter() - start, len(records) if rows is None else rows)
+                self.saved += count
+                if on_saved:
+                    on_saved(count)
+            except BaseException as e:
+                # 记录错误后继续消费队列，避免submit方永久阻塞
+                self.error = e
+
+    def close(self) -> int:
+        """等待队列中的批次全部写完，返回总保存条数"""
+        self.queue.put(None)
+        self.thread.join()
+
+        if self.error:
+            raise RuntimeError(f"后台写入失败: {self.error}") from self.error
+        return self.saved
+
+    def __enter__(self) -> "BackgroundWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # 主流程已出错，只需让写入线程退出
+            self.queue.put(None)
+            self.thread.join()
+
+
+def clone_record(record):
+    """
+    浅拷贝TickData/BarData
+
+    vnpy_sqlite等数据库的save_xxx_data会原地修改对象的__dict__（转换时区、
+    exchange改为字符串、弹出gateway_name），保存失败后原对象无法再次保存，
+    因此每次尝试保存前都使用副本
+    """
+    copied = record.__class__.__new__(record.__class__)
+    copied.__dict__.update(record.__dict__)
+    return copied
+
+
+def save_with_bisect(save_func: Callable[[list], object], records: list,
+                     on_reject: Optional[Callable[[object, Exception], None]] = None) -> int:
+    """
+    保存一个批次，失败时对半拆分递归重试，返回成功保存的条数
+
+    k条问题记录只需O(k log n)次保存即可定位，正常记录仍按大批次写入；
+    单条仍失败的记录交给on_reject(record, error)处理
+    """
+    if not records:
+        return 0
+
+    try:
+        save_func([clone_record(record) for record in records])
+        return len(records)
+    except Exception as e:
+        if len(records) == 1:
+            if on_reject:
+                on_reject(records[0], e)
+            return 0
+
+    mid = len(records) // 2
+    return save_with_bisect(save_func, records[:mid], on_reject) + save_with_bisect(save_func, records[mid:], on_reject)
+
+
+class RejectWriter:
+    """
+    拒绝记录写入器：把保存失败的记录连同异常信息追加写入CSV
+
+    首次写入时才创建文件，没有拒绝记录时不会产生空文件。
+    列为记录的属性、extra_fields（排序）和error，与记录是否设置了额外字段无关；
+    追加写入已有文件时沿用文件中的表头，保证各次运行写入的行与表头对齐
+    """
+
+    def __init__(self, file_path: Path, extra_fields: Iterable[str] = ()):
+        """
+        Args:
+            file_path: 拒绝文件路径
+            extra_fields: 记录上可能通过setattr设置的额外字段（如settlement_price）
+        """
+        self.file_path = Path(file_path)
+        self.extra_fields = sorted(set(extra_fields))
+        self.count = 0
+        self.lock = Lock()
+        self.file = None
+        self.writer = None
+        self.missing_fields = set()
+
+    def get_fieldnames(self, record: object) -> List[str]:
+        """已有文件使用其表头，否则按记录类型生成固定的列"""
+        if self.file_path.exists() and self.file_path.stat().st_size > 0:
+            with open(self.file_path, newline='', encoding='utf-8-sig') as f:
+                header = next(csv.reader(f), None)
+            if header:
+                return header
+
+        # 记录自身的属性（含__post_init__中设置的vt_symbol），可选的额外字段排序后放在最后
+        fieldnames = [name for name in record.__dict__ if name not in self.extra_fields]
+        return fieldnames + self.extra_fields + ['error']
+
+    def write(self, record: object, error: Exception) -> None:
+        """写入一条拒绝记录"""
+        row = {
+            key: (value.value if isinstance(value, Enum) else value)
+            for key, value in record.__dict__.items()
+        }
+        row['error'] = f"{type(error).__name__}: {error}"
+
+        with self.lock:
+            if self.writer is None:
+                self.file_path.parent.mkdir(parents=True, exist_ok=True)
+                fieldnames = self.get_fieldnames(record)
+                new_file = not self.file_path.exists() or self.file_path.stat().st_size == 0
+                self.file = open(self.file_path, 'a', newline='', encoding='utf-8-sig')
+                self.writer = csv.DictWriter(self.file, fieldnames=fieldnames, extrasaction='ignore')
+                if new_file:
+                    self.writer.writeheader()
+
+            missing = set(row) - set(self.writer.fieldnames) - self.missing_fields
+            if missing:
+                self.missing_fields |= missing
+                print(f"⚠️  拒绝文件 {self.file_path} 的表头中没有字段 {sorted(missing)}，这些字段不写入")
+
+            self.writer.writerow(row)
+            self.file.flush()
+            self.count += 1
+
+    def close(self) -> None:
+        """关闭文件"""
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+                self.writer = None
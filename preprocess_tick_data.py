@@ -1,9 +1,18 @@
 import pandas as pd
 import numpy as np
+import json
 import os
 from pathlib import Path
 import re
 
+from import_manifest import ImportManifest
+from import_utils import as_source, csv_input, expand_csv_sources, is_csv_source, source_stem
+from tick_store import STORE_SUFFIX, write_tick_parquet
+
+
+# 增量模式下记录输入文件状态的清单，位于输出目录下
+MANIFEST_NAME = ".preprocess_manifest.json"
+
 
 def safe_datetime_conversion(date_str, time_str):
     """安全的日期时间转换"""
@@ -33,11 +42,66 @@ def safe_datetime_conversion(date_str, time_str):
         return pd.NaT
 
 
+def normalize_dates(values):
+    """整列格式化日期：8位数字（20231101）转为YYYY-MM-DD，其他保持原样"""
+    values = values.astype(str).str.strip()
+    compact = values.str.fullmatch(r'\d{8}').fillna(False).astype(bool)
+    formatted = values.str[:4] + '-' + values.str[4:6] + '-' + values.str[6:]
+    return values.where(~compact, formatted)
+
+
+def normalize_times(values):
+    """
+    整列格式化时间，规则与safe_datetime_conversion相同：
+    HH:MM补齐为HH:MM:00，紧凑格式930/0930转为09:30:00，其他保持原样
+    """
+    values = values.astype(str).str.strip()
+
+    hour_minute = values.str.extract(r'^([^:]*):([^:]*)$')
+    is_hour_minute = hour_minute[0].notna()
+    hour_minute = hour_minute[0].str.zfill(2) + ':' + hour_minute[1].str.zfill(2) + ':00'
+
+    is_compact = values.str.fullmatch(r'\d{3,4}').fillna(False).astype(bool)
+    compact = values.str.zfill(4)
+    compact = compact.str[:2] + ':' + compact.str[2:] + ':00'
+
+    values = values.where(~is_hour_minute, hour_minute)
+    return values.where(~is_compact, compact)
+
+
+def convert_datetime_columns(dates, times):
+    """
+    整列把TradingDay和UpdateTime合并为时间
+
+    只对不重复的(日期, 时间)组合做格式化和解析（一个交易日内时间大量重复），
+    先按ISO8601整列解析，解析失败的组合再逐个按任意格式解析，仍失败的为NaT
+
+    Returns:
+        datetime64列，索引与输入相同
+    """
+    date_codes, date_uniques = pd.factorize(dates, use_na_sentinel=False)
+    time_codes, time_uniques = pd.factorize(times, use_na_sentinel=False)
+
+    # 不重复的(日期, 时间)组合
+    pair_codes, pairs = pd.factorize(date_codes.astype(np.int64) * len(time_uniques) + time_codes)
+    pair_dates = normalize_dates(pd.Series(date_uniques, dtype=object)).take(pairs // len(time_uniques))
+    pair_times = normalize_times(pd.Series(time_uniques, dtype=object)).take(pairs % len(time_uniques))
+    texts = pair_dates.reset_index(drop=True) + ' ' + pair_times.reset_index(drop=True)
+
+    parsed = pd.to_datetime(texts, format='ISO8601', errors='coerce')
+    missing = parsed.isna() & texts.notna()
+    if missing.any():
+        parsed[missing] = pd.to_datetime(texts[missing], format='mixed', errors='coerce')
+
+    return pd.Series(parsed.to_numpy()[pair_codes], index=dates.index)
+
+
 def process_file(input_path, output_dir, date_str):
-    """处理单个文件"""
+    """处理单个文件，输出路径以.parquet结尾时写入Parquet分区文件，否则写入CSV"""
     try:
-        # 读取文件
-        df = pd.read_csv(input_path)
+        # 读取文件（压缩文件边解压边读取）
+        with csv_input(input_path) as source:
+            df = pd.read_csv(source)
 
         # 确保必要的列存在
         required_cols = ['TradingDay', 'UpdateTime']
@@ -45,14 +109,20 @@ def process_file(input_path, output_dir, date_str):
             print(f"文件 {input_path} 缺少必要的列，跳过处理")
             return False
 
-        # 应用转换
-        df['UpdateTime'] = df.apply(
-            lambda row: safe_datetime_conversion(row['TradingDay'], row['UpdateTime']),
-            axis=1
-        )
+        # 整列转换，转换失败的行为NaT并汇总报告
+        converted = convert_datetime_columns(df['TradingDay'], df['UpdateTime'])
+        failed = converted.isna()
+        if failed.any():
+            samples = df.loc[failed, required_cols].drop_duplicates().head(3)
+            examples = ", ".join(f"date={row.TradingDay}, time={row.UpdateTime}" for row in samples.itertuples())
+            print(f"文件 {input_path}: {int(failed.sum())}/{len(df)} 行日期时间转换失败，例如: {examples}")
+        df['UpdateTime'] = converted
 
         # 保存文件
-        df.to_csv(output_dir, index=False)
+        if str(output_dir).endswith(STORE_SUFFIX):
+            write_tick_parquet(df, output_dir)
+        else:
+            df.to_csv(output_dir, index=False)
         return True
 
     except Exception as e:
@@ -60,78 +130,209 @@ def process_file(input_path, output_dir, date_str):
         return False
 
 
-def batch_process_files(input_base_path, output_base_path):
+def iter_raw_files(input_path, start_date=None, end_date=None):
     """
-    批量处理文件夹下的所有CSV文件
+    用os.scandir遍历 年月/日期/*.csv 目录树，按日期、文件名顺序生成(输入文件, 日期)
 
-    参数:
-    input_base_path: 输入文件夹的基础路径 (例如: "./data/ticks")
-    output_base_path: 输出文件夹的基础路径 (例如: "./data/processed")
-    """
-    # 将路径转换为Path对象
-    input_path = Path(input_base_path)
-    output_path = Path(output_base_path)
-
-    # 确保输出目录存在
-    output_path.mkdir(parents=True, exist_ok=True)
-
-    # 统计信息
-    processed_count = 0
-    error_count = 0
+    日期目录下也可以是.csv.gz、.csv.zst文件或包含多个产品CSV的zip压缩包
 
-    # 遍历输入目录
-    for year_month_dir in input_path.iterdir():
-        if not year_month_dir.is_dir():
-            continue
+    start_date、end_date为YYYYMMDD（都包含），范围外的日期目录不进入
+    """
+    with os.scandir(input_path) as month_entries:
+        month_dirs = sorted((e for e in month_entries if e.is_dir()), key=lambda e: e.name)
 
+    for year_month_dir in month_dirs:
         # 检查目录名是否是年月格式 (如: 202311)
         year_month = year_month_dir.name
         if not re.match(r'^\d{6}$', year_month):
-            print(f"跳过非年月格式的目录: {year_month_dir}")
+            print(f"跳过非年月格式的目录: {year_month_dir.path}")
+            continue
+        if (start_date and year_month < start_date[:6]) or (end_date and year_month > end_date[:6]):
             continue
 
-        print(f"处理月份: {year_month}")
-
-        # 遍历日期目录
-        for date_dir in year_month_dir.iterdir():
-            if not date_dir.is_dir():
-                continue
+        with os.scandir(year_month_dir.path) as date_entries:
+            date_dirs = sorted((e for e in date_entries if e.is_dir()), key=lambda e: e.name)
 
+        for date_dir in date_dirs:
             # 检查目录名是否是日期格式 (如: 20231101)
             date_str = date_dir.name
             if not re.match(r'^\d{8}$', date_str):
-                print(f"跳过非日期格式的目录: {date_dir}")
+                print(f"跳过非日期格式的目录: {date_dir.path}")
+                continue
+            if (start_date and date_str < start_date) or (end_date and date_str > end_date):
                 continue
 
-            print(f"  处理日期: {date_str}")
+            with os.scandir(date_dir.path) as file_entries:
+                csv_files = sorted(Path(e.path) for e in file_entries if is_csv_source(e.name) and e.is_file())
+
+            for csv_file in expand_csv_sources(csv_files):
+                yield csv_file, date_str
+
+
+def scan_tasks(input_path, output_path, start_date=None, end_date=None, suffix=".csv"):
+    """
+    扫描原始目录树，返回[(输入文件, 输出文件SAVEPATH/产品名称/日期{suffix}, 日期)]
+    """
+    return [
+        # 产品名称为去掉.csv及压缩扩展名的文件名
+        (csv_file, output_path / source_stem(csv_file) / f"{date_str}{suffix}", date_str)
+        for csv_file, date_str in iter_raw_files(input_path, start_date, end_date)
+    ]
+
+
+def load_manifest(output_path):
+    """读取增量清单：输出文件相对路径 -> {input, size, mtime, hash}"""
+    manifest_path = Path(output_path) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"增量清单 {manifest_path} 无法读取，全部重新处理: {e}")
+        return {}
 
-            # 遍历该日期目录下的所有CSV文件
-            for csv_file in date_dir.glob("*.csv"):
-                if not csv_file.is_file():
-                    continue
 
-                # 提取产品名称 (去掉.csv扩展名)
-                product_name = csv_file.stem
+def save_manifest(output_path, manifest):
+    """写入增量清单（先写临时文件再替换，中断时不会留下损坏的清单）"""
+    manifest_path = Path(output_path) / MANIFEST_NAME
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
 
-                # 构建输出路径: SAVEPATH/产品名称/日期.csv
-                product_output_dir = output_path / product_name
-                product_output_dir.mkdir(parents=True, exist_ok=True)
 
-                output_file_path = product_output_dir / f"{date_str}.csv"
+def file_state(file_path):
+    """输入文件的{size, mtime, hash}"""
+    stat = as_source(file_path).stat()
+    return {'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': ImportManifest.hash_file(file_path)}
 
-                print(f"    处理: {product_name}.csv -> {product_name}/{date_str}.csv")
+
+def is_up_to_date(csv_file, output_file_path, record):
+    """
+    输出文件是否无需重新生成：输出文件比输入文件新，且清单中记录的输入文件校验和仍然一致
+
+    输入文件大小和修改时间都与记录一致时不再计算哈希，否则重新计算哈希比较
+    （例如保留了旧修改时间拷贝进来的文件）
+    """
+    if not record or not output_file_path.exists():
+        return False
+
+    input_stat = csv_file.stat()
+    if output_file_path.stat().st_mtime < input_stat.st_mtime:
+        return False
+
+    if record['size'] == input_stat.st_size and record['mtime'] == input_stat.st_mtime:
+        return True
+    return record['size'] == input_stat.st_size and record['hash'] == ImportManifest.hash_file(csv_file)
+
+
+def process_task(csv_file, output_file_path, date_str, record_state=False):
+    """
+    处理单个文件，record_state为True时同时返回处理前输入文件的状态
+
+    Returns:
+        (是否成功, 输入文件状态或None)
+    """
+    state = file_state(csv_file) if record_state else None
+    return process_file(csv_file, output_file_path, date_str), state
+
+
+def batch_process_files(input_base_path, output_base_path, workers=1, incremental=False,
+                        start_date=None, end_date=None, output_format="csv"):
+    """
+    批量处理文件夹下的所有CSV文件
+
+    参数:
+    input_base_path: 输入文件夹的基础路径 (例如: "./data/ticks")
+    output_base_path: 输出文件夹的基础路径 (例如: "./data/processed")
+    workers: 并行处理的进程数，1为串行，0或None为CPU核数
+    incremental: 增量模式，输出文件比输入新且输入校验和未变化时跳过
+    start_date: 只处理该日期（YYYYMMDD，包含）及之后的日期目录
+    end_date: 只处理该日期（YYYYMMDD，包含）及之前的日期目录
+    output_format: 输出格式，csv或parquet（按 产品/日期.parquet 分区的列式存储，需要pyarrow）
+    """
+    # 将路径转换为Path对象
+    input_path = Path(input_base_path)
+    output_path = Path(output_base_path)
+
+    # 确保输出目录存在
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    # 先扫描出全部文件，输出目录在主进程中统一创建
+    suffix = STORE_SUFFIX if output_format == "parquet" else ".csv"
+    tasks = scan_tasks(input_path, output_path, start_date, end_date, suffix)
+
+    # 增量模式：跳过已是最新的输出文件
+    manifest = load_manifest(output_path) if incremental else {}
+    skipped_count = 0
+    if incremental:
+        pending = []
+        for task in tasks:
+            key = task[1].relative_to(output_path).as_posix()
+            if is_up_to_date(task[0], task[1], manifest.get(key)):
+                skipped_count += 1
+            else:
+                pending.append(task)
+        tasks = pending
+
+    for product_output_dir in {output_file.parent for _, output_file, _ in tasks}:
+        product_output_dir.mkdir(parents=True, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    print(f"共 {len(tasks)} 个文件待处理，已是最新跳过 {skipped_count} 个，"
+          f"使用 {min(workers, max(len(tasks), 1))} 个进程")
+
+    # 统计信息
+    processed_count = 0
+    error_count = 0
+
+    def record_result(csv_file, output_file_path, ok, state):
+        """汇总单个文件的结果，增量模式下记录成功文件的输入状态"""
+        nonlocal processed_count, error_count
+        key = output_file_path.relative_to(output_path).as_posix()
+        if ok:
+            processed_count += 1
+            if incremental:
+                manifest[key] = dict(state, input=str(csv_file))
+        else:
+            error_count += 1
+            manifest.pop(key, None)
+
+    try:
+        if workers > 1 and len(tasks) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            # 每个文件独立输出，结果按提交顺序返回，只在主进程中汇总计数
+            inputs, outputs, dates = zip(*tasks)
+            chunksize = max(1, len(tasks) // (workers * 8))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(process_task, inputs, outputs, dates, [incremental] * len(tasks),
+                                       chunksize=chunksize)
+                for i, ((csv_file, output_file_path, date_str), (ok, state)) in enumerate(zip(tasks, results), 1):
+                    status = "完成" if ok else "失败"
+                    print(f"  [{i}/{len(tasks)}] {status}: {csv_file.name} -> {output_file_path.parent.name}/{output_file_path.name}")
+                    record_result(csv_file, output_file_path, ok, state)
+        else:
+            for csv_file, output_file_path, date_str in tasks:
+                print(f"    处理: {csv_file.name} -> {output_file_path.parent.name}/{output_file_path.name}")
 
                 # 处理文件
-                if process_file(csv_file, output_file_path, date_str):
-                    processed_count += 1
-                else:
-                    error_count += 1
+                ok, state = process_task(csv_file, output_file_path, date_str, incremental)
+                record_result(csv_file, output_file_path, ok, state)
+    finally:
+        # 中途中断时也保留已完成文件的记录
+        if incremental:
+            save_manifest(output_path, manifest)
 
     # 输出统计信息
     print("\n" + "=" * 50)
     print(f"处理完成!")
     print(f"成功处理: {processed_count} 个文件")
     print(f"处理失败: {error_count} 个文件")
+    if incremental:
+        print(f"已是最新: {skipped_count} 个文件")
     print(f"输出目录: {output_path.absolute()}")
 
     return processed_count, error_count
@@ -139,9 +340,24 @@ def batch_process_files(input_base_path, output_base_path):
 
 # 使用示例
 if __name__ == "__main__":
+    import argparse
+
     # 设置输入和输出路径
     INPUT_PATH = "./data/ticks"  # 根据实际情况修改
     OUTPUT_PATH = "./data/processed_ticks"  # 根据实际情况修改
 
+    parser = argparse.ArgumentParser(description='预处理Tick数据：规范日期时间并按 产品/日期.csv 输出')
+    parser.add_argument('--input', type=str, default=INPUT_PATH, help='输入文件夹（年月/日期/*.csv）')
+    parser.add_argument('--output', type=str, default=OUTPUT_PATH, help='输出文件夹')
+    parser.add_argument('--workers', type=int, default=1, help='并行处理的进程数，0为CPU核数（默认1）')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量模式：输出文件比输入新且输入文件校验和未变化时跳过')
+    parser.add_argument('--start-date', type=str, default=None, help='只处理该日期及之后的目录（YYYYMMDD）')
+    parser.add_argument('--end-date', type=str, default=None, help='只处理该日期及之前的目录（YYYYMMDD）')
+    parser.add_argument('--format', type=str, choices=['csv', 'parquet'], default='csv',
+                        help='输出格式：csv，或按 产品/日期.parquet 分区的列式存储（需要pyarrow）')
+    args = parser.parse_args()
+
     # 执行批量处理
-    processed, errors = batch_process_files(INPUT_PATH, OUTPUT_PATH)
\ No newline at end of file
+    processed, errors = batch_process_files(args.input, args.output, args.workers, args.incremental,
+                                            args.start_date, args.end_date, args.format)
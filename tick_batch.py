@@ -0,0 +1,286 @@
+"""
+tick_batch.py
+列式Tick容器：用NumPy结构化数组代替List[TickData]
+
+- 每个TickData数值字段一列（float64），时间为datetime64[us]，合约、交易所、名称存为
+  类别编号（int32）加类别列表，每行约270字节，而带五档盘口的TickData对象每个超过1KB
+- 按位置切片、按时间范围取子集（已按时间排序时）、按合约取子集（已按合约排序时）
+  都返回共享内存的视图，不复制数据
+- 需要时再按行生成TickData，也可以由TickData列表或DataFrame构造
+
+时区：所有行共用一个时区（取自第一个Tick），数组中保存该时区下的无时区时间，
+生成TickData时再附加时区。gateway_name为整批共用，localtime和extra不保存
+"""
+from datetime import datetime, tzinfo
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from vnpy.trader.constant import Exchange
+from vnpy.trader.object import TickData
+
+
+# TickData的数值字段，按TickData中的定义顺序
+TICK_VALUE_FIELDS = [
+    'volume', 'turnover', 'open_interest', 'last_price', 'last_volume',
+    'limit_up', 'limit_down', 'open_price', 'high_price', 'low_price', 'pre_close',
+    'bid_price_1', 'bid_price_2', 'bid_price_3', 'bid_price_4', 'bid_price_5',
+    'ask_price_1', 'ask_price_2', 'ask_price_3', 'ask_price_4', 'ask_price_5',
+    'bid_volume_1', 'bid_volume_2', 'bid_volume_3', 'bid_volume_4', 'bid_volume_5',
+    'ask_volume_1', 'ask_volume_2', 'ask_volume_3', 'ask_volume_4', 'ask_volume_5',
+]
+
+# 以类别编号保存的字符串字段
+CATEGORY_FIELDS = ['symbol', 'exchange', 'name']
+
+TICK_DTYPE = np.dtype(
+    [(name, np.int32) for name in CATEGORY_FIELDS]
+    + [('datetime', 'datetime64[us]')]
+    + [(name, np.float64) for name in TICK_VALUE_FIELDS]
+)
+
+
+class TickBatch:
+    """一批Tick数据的列式存储"""
+
+    def __init__(self, data: np.ndarray, categories: Dict[str, List], gateway_name: str = "",
+                 tz: Optional[tzinfo] = None):
+        """
+        Args:
+            data: TICK_DTYPE结构化数组
+            categories: 字段名 -> 类别列表（symbol、name为字符串，exchange为Exchange）
+            gateway_name: 生成TickData时使用的接口名
+            tz: 生成TickData时附加的时区，None表示无时区
+        """
+        if data.dtype != TICK_DTYPE:
+            raise ValueError(f"data的类型必须是TICK_DTYPE，当前为: {data.dtype}")
+
+        self.data = data
+        self.categories = categories
+        self.gateway_name = gateway_name
+        self.tz = tz
+
+    @classmethod
+    def empty(cls, size: int = 0, gateway_name: str = "") -> "TickBatch":
+        """创建全0的批次"""
+        return cls(np.zeros(size, dtype=TICK_DTYPE), {name: [] for name in CATEGORY_FIELDS}, gateway_name)
+
+    @classmethod
+    def from_ticks(cls, ticks: Sequence[TickData]) -> "TickBatch":
+        """由TickData列表构造，gateway_name和时区取自第一个Tick"""
+        if not ticks:
+            return cls.empty()
+
+        data = np.zeros(len(ticks), dtype=TICK_DTYPE)
+        categories = {}
+        for name in CATEGORY_FIELDS:
+            codes, uniques = pd.factorize(pd.Series([getattr(t, name) for t in ticks], dtype=object))
+            data[name] = codes
+            categories[name] = list(uniques)
+
+        tz = ticks[0].datetime.tzinfo
+        if tz is None:
+            datetimes = [t.datetime for t in ticks]
+        else:
+            datetimes = [t.datetime.astimezone(tz).replace(tzinfo=None) for t in ticks]
+        data['datetime'] = np.array(datetimes, dtype='datetime64[us]')
+
+        for name in TICK_VALUE_FIELDS:
+            data[name] = [getattr(t, name) for t in ticks]
+
+        return cls(data, categories, ticks[0].gateway_name, tz)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, exchange: Exchange, gateway_name: str = "") -> "TickBatch":
+        """
+        由DataFrame构造，不创建TickData对象
+
+        Args:
+            frame: 包含symbol、datetime列以及TickData数值字段同名列的DataFrame
+                （与SqliteBulkLoader.save_tick_frame的输入相同），缺少的数值列为0
+            exchange: 交易所
+            gateway_name: 接口名
+        """
+        data = np.zeros(len(frame), dtype=TICK_DTYPE)
+
+        codes, uniques = pd.factorize(frame['symbol'].astype(object).map(str))
+        data['symbol'] = codes
+        categories = {'symbol': list(uniques), 'exchange': [exchange], 'name': [""]}
+
+        datetimes = frame['datetime']
+        tz = datetimes.dt.tz
+        if tz is not None:
+            datetimes = datetimes.dt.tz_localize(None)
+        data['datetime'] = datetimes.to_numpy(dtype='datetime64[us]')
+
+        for name in TICK_VALUE_FIELDS:
+            if name in frame.columns:
+                data[name] = frame[name].to_numpy(dtype=np.float64, na_value=0)
+
+        return cls(data, categories, gateway_name, tz)
+
+    @classmethod
+    def concat(cls, batches: Iterable["TickBatch"]) -> "TickBatch":
+        """合并多个批次（复制数据），gateway_name和时区取自第一个批次"""
+        batches = list(batches)
+        if not batches:
+            return cls.empty()
+
+        categories = {name: [] for name in CATEGORY_FIELDS}
+        arrays = []
+        for batch in batches:
+            data = batch.data.copy()
+            for name in CATEGORY_FIELDS:
+                merged = categories[name]
+                mapping = []
+                for value in batch.categories[name]:
+                    if value not in merged:
+                        merged.append(value)
+                    mapping.append(merged.index(value))
+                if mapping:
+                    data[name] = np.asarray(mapping, dtype=np.int32)[data[name]]
+            arrays.append(data)
+
+        first = batches[0]
+        return cls(np.concatenate(arrays), categories, first.gateway_name, first.tz)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def nbytes(self) -> int:
+        """数组占用的字节数"""
+        return self.data.nbytes
+
+    def derive(self, data: np.ndarray) -> "TickBatch":
+        """以新的数组创建批次，共享类别列表"""
+        return TickBatch(data, self.categories, self.gateway_name, self.tz)
+
+    def __getitem__(self, index: Union[int, slice, np.ndarray]) -> Union[TickData, "TickBatch"]:
+        """
+        整数下标返回TickData；切片返回视图；布尔数组或下标数组返回副本
+        """
+        if isinstance(index, (int, np.integer)):
+            return self.make_tick(self.data[index])
+        return self.derive(self.data[index])
+
+    def __iter__(self) -> Iterator[TickData]:
+        """逐行生成TickData，每次只转换一小块"""
+        block = 10000
+        for start in range(0, len(self.data), block):
+            yield from self[start:start + block].to_ticks()
+
+    def make_tick(self, row: np.void) -> TickData:
+        """由一行数据生成TickData"""
+        dt = row['datetime'].astype('datetime64[us]').astype(datetime)
+        if self.tz is not None:
+            dt = dt.replace(tzinfo=self.tz)
+
+        return TickData(
+            gateway_name=self.gateway_name,
+            symbol=self.categories['symbol'][row['symbol']],
+            exchange=self.categories['exchange'][row['exchange']],
+            datetime=dt,
+            name=self.categories['name'][row['name']],
+            **{name: float(row[name]) for name in TICK_VALUE_FIELDS},
+        )
+
+    def to_ticks(self) -> List[TickData]:
+        """转换为TickData列表"""
+        data = self.data
+        symbols = [self.categories['symbol'][code] for code in data['symbol'].tolist()]
+        exchanges = [self.categories['exchange'][code] for code in data['exchange'].tolist()]
+        names = [self.categories['name'][code] for code in data['name'].tolist()]
+
+        datetimes = data['datetime'].astype(object)
+        if self.tz is not None:
+            datetimes = [dt.replace(tzinfo=self.tz) for dt in datetimes]
+
+        values = zip(*[data[name].tolist() for name in TICK_VALUE_FIELDS])
+
+        return [
+            TickData(
+                gateway_name=self.gateway_name,
+                symbol=symbol,
+                exchange=exchange,
+                datetime=dt,
+                name=name,
+                **dict(zip(TICK_VALUE_FIELDS, row)),
+            )
+            for symbol, exchange, dt, name, row in zip(symbols, exchanges, datetimes, names, values)
+        ]
+
+    def to_frame(self) -> pd.DataFrame:
+        """转换为DataFrame（symbol、exchange、name为category列），可直接交给SqliteBulkLoader"""
+        frame = pd.DataFrame({
+            name: pd.Categorical.from_codes(self.data[name], categories=self.categories[name])
+            if self.categories[name] else pd.Categorical([])
+            for name in CATEGORY_FIELDS
+        })
+        datetimes = pd.Series(self.data['datetime'])
+        frame['datetime'] = datetimes.dt.tz_localize(self.tz) if self.tz is not None else datetimes
+        for name in TICK_VALUE_FIELDS:
+            frame[name] = self.data[name]
+        return frame
+
+    def is_sorted(self, field: str = 'datetime') -> bool:
+        """是否已按字段升序排列"""
+        values = self.data[field]
+        return len(values) < 2 or bool((values[1:] >= values[:-1]).all())
+
+    def sort(self, by: Union[str, List[str]] = 'datetime') -> "TickBatch":
+        """稳定排序后返回新批次（复制数据），by为字段名或字段名列表（前者优先）"""
+        keys = [by] if isinstance(by, str) else list(by)
+        order = np.lexsort([self.data[key] for key in reversed(keys)])
+        return self.derive(self.data[order])
+
+    def between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> "TickBatch":
+        """
+        取start到end（都包含）之间的数据
+
+        已按时间排序时用二分查找返回视图，否则返回副本
+        """
+        times = self.data['datetime']
+        lower = self.to_datetime64(start) if start is not None else None
+        upper = self.to_datetime64(end) if end is not None else None
+
+        if self.is_sorted():
+            left = np.searchsorted(times, lower, side='left') if lower is not None else 0
+            right = np.searchsorted(times, upper, side='right') if upper is not None else len(times)
+            return self.derive(self.data[left:right])
+
+        mask = np.ones(len(times), dtype=bool)
+        if lower is not None:
+            mask &= times >= lower
+        if upper is not None:
+            mask &= times <= upper
+        return self.derive(self.data[mask])
+
+    def for_symbol(self, symbol: str) -> "TickBatch":
+        """
+        取单个合约的数据
+
+        已按合约排序时（如sort(['symbol', 'datetime'])之后）返回视图，否则返回副本
+        """
+        if symbol not in self.categories['symbol']:
+            return self.derive(self.data[:0])
+
+        code = self.categories['symbol'].index(symbol)
+        codes = self.data['symbol']
+        if self.is_sorted('symbol'):
+            left = np.searchsorted(codes, code, side='left')
+            right = np.searchsorted(codes, code, side='right')
+            return self.derive(self.data[left:right])
+        return self.derive(self.data[codes == code])
+
+    def split_by_symbol(self) -> Dict[str, "TickBatch"]:
+        """按合约拆分，每个合约内按时间排序（排序复制一次，各合约为视图）"""
+        ordered = self.sort(['symbol', 'datetime'])
+        symbols = self.categories['symbol']
+        return {symbols[code]: ordered.for_symbol(symbols[code]) for code in np.unique(self.data['symbol'])}
+
+    def to_datetime64(self, dt: datetime) -> np.datetime64:
+        """把查询时间转换为数组中的无时区时间"""
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(self.tz).replace(tzinfo=None) if self.tz is not None else dt.replace(tzinfo=None)
+        return np.datetime64(dt, 'us')
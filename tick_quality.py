@@ -0,0 +1,183 @@
+"""
+tick_quality.py
+Tick数据时间与质量画像（整列运算）
+
+按合约统计整个数据集：
+- Tick间隔分布（分位数和直方图）、重复时间戳、超过阈值的时间缺口（休市、断线）
+- 买一价高于卖一价（crossed）、买一价等于卖一价（locked）
+- 最新价为0、价格超出涨跌停
+- 累计成交量下降（不计跨越时间缺口的位置，交易日切换时成交量清零属于正常）
+
+所有统计都在按(合约, 时间)排序后的数组上整列完成，只按合约循环，
+几千万条Tick也只需数秒。结果为可JSON序列化的字典，可用于导入前的质量门槛
+"""
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from tick_batch import TickBatch
+
+
+# 间隔直方图的桶上界（秒），最后一个桶收集更大的值
+INTERVAL_BUCKETS = [0, 0.25, 0.5, 1, 2, 5, 10, 60, 300]
+
+
+def profile_ticks(batch: TickBatch, gap_seconds: float = 300, top_gaps: int = 5) -> Dict:
+    """
+    生成数据质量报告
+
+    Args:
+        batch: 待检查的Tick数据
+        gap_seconds: 超过该秒数的间隔视为时间缺口
+        top_gaps: 每个合约报告的最大缺口个数
+
+    Returns:
+        {total_ticks, bad_ticks, bad_ratio, symbols: {合约: 统计}}
+    """
+    data = batch.data
+    order = np.lexsort((data['datetime'], data['symbol']))
+    data = data[order]
+
+    codes = data['symbol']
+    if not len(codes):
+        return {
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'gap_seconds': gap_seconds,
+            'total_ticks': 0,
+            'bad_ticks': 0,
+            'bad_ratio': 0.0,
+            'symbols': {},
+        }
+
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(data)]))
+
+    symbols = {}
+    for start, end in zip(starts, ends):
+        symbol = batch.categories['symbol'][codes[start]]
+        symbols[symbol] = profile_symbol(data[start:end], gap_seconds, top_gaps)
+
+    total = len(data)
+    bad = sum(report['bad_ticks'] for report in symbols.values())
+    return {
+        'generated': datetime.now().isoformat(timespec='seconds'),
+        'gap_seconds': gap_seconds,
+        'total_ticks': total,
+        'bad_ticks': bad,
+        'bad_ratio': round(bad / total, 6),
+        'symbols': symbols,
+    }
+
+
+def profile_symbol(data: np.ndarray, gap_seconds: float, top_gaps: int) -> Dict:
+    """单个合约（已按时间排序）的质量统计"""
+    times = data['datetime']
+    intervals = np.diff(times).astype('timedelta64[us]').astype(np.int64) / 1e6
+
+    # 时间缺口
+    gap_positions = np.flatnonzero(intervals > gap_seconds)
+    largest = gap_positions[np.argsort(intervals[gap_positions], kind='stable')[::-1][:top_gaps]]
+    gaps = [
+        {
+            'start': str(times[i]),
+            'end': str(times[i + 1]),
+            'seconds': round(float(intervals[i]), 3),
+        }
+        for i in sorted(largest)
+    ]
+
+    # 盘口
+    bid, ask = data['bid_price_1'], data['ask_price_1']
+    quoted = (bid > 0) & (ask > 0)
+    crossed = quoted & (bid > ask)
+    locked = quoted & (bid == ask)
+
+    # 价格
+    last = data['last_price']
+    zero_price = last <= 0
+    limit_up, limit_down = data['limit_up'], data['limit_down']
+    limit_violation = np.zeros(len(data), dtype=bool)
+    for prices in (last, bid, ask):
+        limit_violation |= (prices > 0) & (limit_up > 0) & (prices > limit_up)
+        limit_violation |= (prices > 0) & (limit_down > 0) & (prices < limit_down)
+
+    # 累计成交量下降，跨越时间缺口的位置（新交易日清零）不计
+    volume_decrease = np.zeros(len(data), dtype=bool)
+    volume_decrease[1:] = (np.diff(data['volume']) < 0) & (intervals <= gap_seconds)
+
+    bad = crossed | zero_price | limit_violation | volume_decrease
+
+    return {
+        'ticks': len(data),
+        'start': str(times[0]) if len(data) else None,
+        'end': str(times[-1]) if len(data) else None,
+        'interval': summarize_intervals(intervals),
+        'duplicate_timestamps': int((intervals == 0).sum()),
+        'gaps': {'count': len(gap_positions), 'largest': gaps},
+        'crossed_books': int(crossed.sum()),
+        'locked_books': int(locked.sum()),
+        'zero_prices': int(zero_price.sum()),
+        'limit_violations': int(limit_violation.sum()),
+        'volume_decreases': int(volume_decrease.sum()),
+        'bad_ticks': int(bad.sum()),
+        'bad_ratio': round(float(bad.mean()), 6) if len(data) else 0.0,
+    }
+
+
+def summarize_intervals(intervals: np.ndarray) -> Dict:
+    """间隔（秒）的分位数和直方图"""
+    if not len(intervals):
+        return {'count': 0}
+
+    p50, p90, p99 = np.percentile(intervals, [50, 90, 99])
+    counts = np.bincount(np.searchsorted(INTERVAL_BUCKETS, intervals, side='left'),
+                         minlength=len(INTERVAL_BUCKETS) + 1)
+    histogram = {f"le_{b}s": int(c) for b, c in zip(INTERVAL_BUCKETS, counts)}
+    histogram['inf'] = int(counts[-1])
+
+    return {
+        'count': len(intervals),
+        'mean': round(float(intervals.mean()), 6),
+        'min': round(float(intervals.min()), 6),
+        'p50': round(float(p50), 6),
+        'p90': round(float(p90), 6),
+        'p99': round(float(p99), 6),
+        'max': round(float(intervals.max()), 6),
+        'histogram': histogram,
+    }
+
+
+def failing_symbols(report: Dict, max_bad_ratio: float) -> List[str]:
+    """返回问题Tick比例超过阈值的合约"""
+    return [symbol for symbol, stats in report['symbols'].items() if stats['bad_ratio'] > max_bad_ratio]
+
+
+def print_quality_report(report: Dict) -> None:
+    """打印质量报告摘要"""
+    print(f"\n🔍 数据质量 ({report['total_ticks']} 条, 问题Tick {report['bad_ticks']} 条, "
+          f"{report['bad_ratio']:.4%}):")
+    for symbol, stats in report['symbols'].items():
+        interval = stats['interval']
+        print(f"  {symbol}: {stats['ticks']} 条  {stats['start']} ~ {stats['end']}")
+        if interval['count']:
+            print(f"    间隔: 平均 {interval['mean']:.3f}s, 中位数 {interval['p50']:.3f}s, "
+                  f"P99 {interval['p99']:.3f}s, 最大 {interval['max']:.3f}s")
+        print(f"    重复时间戳 {stats['duplicate_timestamps']}, 时间缺口 {stats['gaps']['count']}, "
+              f"crossed {stats['crossed_books']}, locked {stats['locked_books']}, "
+              f"零价格 {stats['zero_prices']}, 超涨跌停 {stats['limit_violations']}, "
+              f"成交量下降 {stats['volume_decreases']}")
+
+
+def write_quality_report(path: Optional[str], report: Dict) -> None:
+    """把报告写入JSON文件，path为None时不写"""
+    if not path:
+        return
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,190 @@
+"""
+tick_store.py
+按 产品/日期 分区的Parquet Tick存储
+
+- 预处理可以输出 SAVEPATH/产品名称/日期.parquet 代替CSV，列与导入器的TICK_FIELDS一致：
+  InstrumentID为字典编码字符串，UpdateTime为微秒时间戳，其余为float64，zstd压缩
+- 文件内按(InstrumentID, UpdateTime)稳定排序写入，行组的最小/最大值统计可用于跳过行组
+- 读取时只读需要的列；先按目录名（产品）和文件名（交易日）跳过分区文件，
+  再按合约和时间条件跳过行组，最后过滤行
+
+pyarrow为可选依赖，只在读写Parquet时导入
+"""
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+# 分区文件扩展名
+STORE_SUFFIX = ".parquet"
+
+
+def import_pyarrow():
+    """导入pyarrow，未安装时提示安装"""
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet存储需要安装pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def store_schema():
+    """分区文件的schema，列名和顺序与CFFEXTickDataImporterFixed.TICK_FIELDS一致"""
+    pa = import_pyarrow()
+    from upload_cffex_tick_data import CFFEXTickDataImporterFixed
+
+    fields = []
+    for column in CFFEXTickDataImporterFixed.TICK_FIELDS:
+        if column == 'InstrumentID':
+            fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+        elif column == 'UpdateTime':
+            fields.append(pa.field(column, pa.timestamp('us')))
+        else:
+            fields.append(pa.field(column, pa.float64()))
+    return pa.schema(fields)
+
+
+def frame_to_table(df: pd.DataFrame):
+    """
+    把预处理后的DataFrame转换为store_schema的Arrow表
+
+    缺少的列为空值；数值列无法转换的值为空值（与导入器的pd.to_numeric(errors='coerce')一致）；
+    UpdateTime不是时间类型时按ISO8601解析
+    """
+    pa = import_pyarrow()
+    schema = store_schema()
+
+    columns = {}
+    symbol_key = time_key = None
+    for field in schema:
+        name = field.name
+        if name not in df.columns:
+            columns[name] = pa.nulls(len(df), field.type)
+            continue
+
+        values = df[name]
+        if name == 'InstrumentID':
+            codes, uniques = pd.factorize(values)
+            symbols = [str(v) for v in uniques]
+            indices = pa.array(codes.astype(np.int32), pa.int32(), mask=codes < 0)
+            columns[name] = pa.DictionaryArray.from_arrays(indices, pa.array(symbols, pa.string()))
+
+            # 排序键：合约代码的字典序，缺失值排在最后
+            ranks = np.empty(len(symbols) + 1, dtype=np.int64)
+            ranks[np.argsort(np.array(symbols, dtype=object), kind='stable')] = np.arange(len(symbols))
+            ranks[-1] = len(symbols)
+            symbol_key = ranks[codes]
+        elif name == 'UpdateTime':
+            if not pd.api.types.is_datetime64_any_dtype(values):
+                values = pd.to_datetime(values, format='ISO8601', errors='coerce')
+            times = values.to_numpy(dtype='datetime64[us]')
+            columns[name] = pa.array(times, type=field.type, from_pandas=True)
+            time_key = np.where(np.isnat(times), np.iinfo(np.int64).max, times.astype(np.int64))
+        else:
+            columns[name] = pa.array(pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64),
+                                     type=field.type, from_pandas=True)
+
+    table = pa.table(columns, schema=schema)
+
+    # 按(合约, 时间)稳定排序，重复时间戳保持原有先后顺序
+    if symbol_key is None or time_key is None:
+        return table
+    return table.take(np.lexsort((time_key, symbol_key)))
+
+
+def write_tick_parquet(df: pd.DataFrame, path: Path, row_group_size: int = 50000,
+                       compression: str = 'zstd') -> None:
+    """写入一个分区文件（先写临时文件再替换，中断时不会留下损坏的文件）"""
+    import_pyarrow()
+    import pyarrow.parquet as pq
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    pq.write_table(frame_to_table(df), tmp_path, row_group_size=row_group_size, compression=compression)
+    os.replace(tmp_path, path)
+
+
+def list_partitions(root: Path, products: Optional[Iterable[str]] = None,
+                    start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Path]:
+    """
+    列出 root/产品名称/交易日.parquet 分区文件，按交易日、产品排序
+
+    Args:
+        root: 存储根目录
+        products: 只列出这些产品，None为全部
+        start_date: 交易日下界（YYYYMMDD，包含）
+        end_date: 交易日上界（YYYYMMDD，包含）
+    """
+    products = set(products) if products is not None else None
+    partitions = []
+
+    with os.scandir(root) as product_entries:
+        for product_dir in product_entries:
+            if not product_dir.is_dir() or (products is not None and product_dir.name not in products):
+                continue
+
+            with os.scandir(product_dir.path) as file_entries:
+                for entry in file_entries:
+                    if not entry.name.endswith(STORE_SUFFIX) or not entry.is_file():
+                        continue
+
+                    trading_day = entry.name[:-len(STORE_SUFFIX)]
+                    if (start_date and trading_day < start_date) or (end_date and trading_day > end_date):
+                        continue
+                    partitions.append((trading_day, product_dir.name, Path(entry.path)))
+
+    return [path for _, _, path in sorted(partitions)]
+
+
+def build_filter(symbols: Optional[Iterable[str]] = None, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None):
+    """合约和时间（都包含）过滤条件，None表示不过滤"""
+    pa = import_pyarrow()
+    import pyarrow.dataset as ds
+
+    conditions = []
+    if symbols is not None:
+        conditions.append(ds.field('InstrumentID').isin(pa.array(list(symbols), pa.string())))
+    if start is not None:
+        conditions.append(ds.field('UpdateTime') >= pa.scalar(start, pa.timestamp('us')))
+    if end is not None:
+        conditions.append(ds.field('UpdateTime') <= pa.scalar(end, pa.timestamp('us')))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def read_tick_store(paths: Iterable[Path], columns: Optional[List[str]] = None,
+                    symbols: Optional[Iterable[str]] = None, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    读取分区文件
+
+    只读取columns列（None为全部）；有合约或时间条件时，统计信息表明不满足条件的行组不读取，
+    读取的行组再逐行过滤。InstrumentID返回为category列，UpdateTime为datetime64列
+    """
+    import_pyarrow()
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset([str(p) for p in paths], format='parquet', schema=store_schema())
+    table = dataset.to_table(columns=columns, filter=build_filter(symbols, start, end))
+    return table.to_pandas()
+
+
+def iter_tick_store(path: Path, chunk_size: int = 500000,
+                    columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """按chunk_size行分块读取单个分区文件"""
+    import_pyarrow()
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        yield batch.to_pandas()
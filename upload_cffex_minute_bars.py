@@ -9,13 +9,27 @@ CSV格式要求：
 """
 import pandas as pd
 import numpy as np
+from contextlib import nullcontext
 from datetime import datetime, time
 from pathlib import Path
-from typing import List, Dict, Set, Optional
+from time import perf_counter
+from typing import List, Dict, Set, Optional, Tuple
 from vnpy.trader.constant import Exchange, Interval
 from vnpy.trader.object import BarData
 from vnpy.trader.database import BaseDatabase, get_database
 
+from bulk_loader import SqliteBulkLoader
+from import_metrics import ImportMetrics, format_stages, write_metrics_log
+from import_utils import (
+    BackgroundWriter,
+    EncodingCache,
+    RejectWriter,
+    expand_csv_sources,
+    parse_datetime_column,
+    read_csv_sniffed,
+    save_with_bisect,
+)
+
 
 class CFFEXMinuteBarImporter:
     """CFFEX交易所多合约分钟Bar数据导入器 (vn.py 4.2版本)"""
@@ -33,12 +47,29 @@ class CFFEXMinuteBarImporter:
         '合约代码': 'symbol'
     }
 
-    def __init__(self, file_path: str):
+    # 候选文件编码（按优先级排列）
+    ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig']
+
+    # 支持的时间格式（按优先级排列）
+    DATETIME_FORMATS = [
+        '%Y-%m-%d %H:%M:%S',
+        '%Y/%m/%d %H:%M:%S',
+        '%Y%m%d %H:%M:%S',
+        '%Y-%m-%d %H:%M',
+        '%Y/%m/%d %H:%M',
+        '%Y%m%d %H:%M',
+    ]
+
+    def __init__(self, file_path: str, reject_file: Optional[str] = None, bulk: bool = False,
+                 metrics_log: Optional[str] = None):
         """
         初始化导入器
 
         Args:
             file_path: CSV文件路径
+            reject_file: 保存失败的Bar连同异常信息写入的CSV文件，None表示不记录
+            bulk: 按列解析，不构造BarData，直接批量写入vnpy_sqlite数据表
+            metrics_log: 导入结束后追加写入分阶段统计的JSON-lines日志，None表示不写
         """
         self.file_path = Path(file_path)
         if not self.file_path.exists():
@@ -48,6 +79,22 @@ class CFFEXMinuteBarImporter:
         self.interval = Interval.MINUTE
         self.gateway_name = "CSV_IMPORT"
         self.database: BaseDatabase = get_database()
+        self.reject_writer: Optional[RejectWriter] = RejectWriter(reject_file) if reject_file else None
+
+        self.bulk_loader: Optional[SqliteBulkLoader] = None
+        if bulk:
+            if SqliteBulkLoader.is_supported(self.database):
+                self.bulk_loader = SqliteBulkLoader(self.database)
+            else:
+                print(f"⚠️  批量写入仅支持vnpy_sqlite，当前数据库为 {type(self.database).__name__}，使用BarData写入")
+
+        # vnpy_sqlite时已存在数据只查询时间列，不加载BarData
+        self.time_index: Optional[SqliteBulkLoader] = self.bulk_loader
+        if self.time_index is None and SqliteBulkLoader.is_supported(self.database):
+            self.time_index = SqliteBulkLoader(self.database)
+
+        # 按目录缓存文件编码，同一导入器读取的文件共用
+        self.encoding_cache = EncodingCache(self.ENCODINGS)
 
         # 统计信息
         self.stats = {
@@ -56,9 +103,14 @@ class CFFEXMinuteBarImporter:
             'invalid_rows': 0,
             'unique_symbols': set(),
             'time_range': {'start': None, 'end': None},
-            'saved_bars': 0
+            'saved_bars': 0,
+            'datetime_rejects': 0,
         }
 
+        # 分阶段计时与计数，导入结束后以字典形式放入stats['metrics']
+        self.metrics = ImportMetrics()
+        self.metrics_log = metrics_log
+
     def parse_datetime(self, dt_str: str) -> Optional[datetime]:
         """
         解析时间字符串为datetime对象
@@ -72,16 +124,7 @@ class CFFEXMinuteBarImporter:
             return None
 
         # 尝试多种时间格式
-        date_formats = [
-            '%Y-%m-%d %H:%M:%S',
-            '%Y/%m/%d %H:%M:%S',
-            '%Y%m%d %H:%M:%S',
-            '%Y-%m-%d %H:%M',
-            '%Y/%m/%d %H:%M',
-            '%Y%m%d %H:%M',
-        ]
-
-        for fmt in date_formats:
+        for fmt in self.DATETIME_FORMATS:
             try:
                 dt = datetime.strptime(dt_str, fmt)
                 # 确保秒数为0（分钟数据特性）
@@ -100,6 +143,14 @@ class CFFEXMinuteBarImporter:
         except:
             return None
 
+    def parse_datetime_column(self, values: pd.Series) -> Tuple[pd.Series, List[str]]:
+        """
+        按列解析时间：每个文件抽样推断一次格式，再整列向量化解析
+        秒数统一置0（分钟数据特性），无法解析的行返回NaT
+        """
+        datetimes, formats = parse_datetime_column(values, self.DATETIME_FORMATS)
+        return datetimes.dt.floor('min'), formats
+
     def validate_symbol(self, symbol: str) -> Optional[str]:
         """
         验证并清理合约代码
@@ -120,9 +171,14 @@ class CFFEXMinuteBarImporter:
             return symbol
         return None
 
-    def parse_row_to_bar(self, row: pd.Series, index: int) -> Optional[BarData]:
+    def parse_row_to_bar(self, row: pd.Series, index: int, dt: Optional[datetime] = None) -> Optional[BarData]:
         """
         将一行数据解析为BarData对象 (vn.py 4.2版本)
+
+        Args:
+            row: 数据行
+            index: 行号
+            dt: 已按列解析好的时间，为None时逐行解析'时间'字段
         """
         try:
             # 1. 解析合约代码
@@ -134,7 +190,8 @@ class CFFEXMinuteBarImporter:
 
             # 2. 解析时间
             raw_time = row.get('时间')
-            dt = self.parse_datetime(raw_time)
+            if dt is None:
+                dt = self.parse_datetime(raw_time)
             if not dt:
                 print(f"行 {index}: 无效的时间格式 '{raw_time}'")
                 return None
@@ -207,20 +264,19 @@ class CFFEXMinuteBarImporter:
         print(f"加载CSV文件: {self.file_path}")
 
         try:
-            # 读取CSV，尝试自动检测编码
-            encodings = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig']
-            df = None
-
-            for encoding in encodings:
-                try:
-                    df = pd.read_csv(self.file_path, encoding=encoding)
-                    print(f"使用编码: {encoding}")
-                    break
-                except UnicodeDecodeError:
-                    continue
-
-            if df is None:
-                raise ValueError("无法识别文件编码，请尝试UTF-8或GBK编码")
+            # 读取CSV，先抽样检测编码，检测结果解码失败时再依次尝试其他编码；
+            # 压缩文件边解压边读取，zip压缩包中的多个CSV按文件名顺序合并
+            frames = []
+            for source in expand_csv_sources([self.file_path]):
+                df, encoding = read_csv_sniffed(source, self.encoding_cache, self.metrics)
+                if df is None:
+                    raise ValueError(f"无法识别文件编码，请尝试UTF-8或GBK编码: {source}")
+                frames.append(df)
+
+            if not frames:
+                raise ValueError(f"压缩包中没有CSV文件: {self.file_path}")
+            df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            print(f"使用编码: {encoding}")
 
             self.stats['total_rows'] = len(df)
             print(f"总行数: {self.stats['total_rows']}")
@@ -252,118 +308,158 @@ class CFFEXMinuteBarImporter:
             print(f"加载CSV文件失败: {e}")
             raise
 
-    def import_data(self, batch_size: int = 10000, skip_existing: bool = True) -> Dict:
+    def import_data(self, batch_size: int = 10000, skip_existing: bool = True, pipeline: bool = False) -> Dict:
         """
         修复版：按合约分组后再分批导入数据
+
+        pipeline为True时由后台线程写库：上一个合约的批次提交期间，
+        主线程继续处理下一个合约的排序、去重和已存在数据查询
         """
         print(f"\n开始导入数据...")
         print(f"批处理大小: {batch_size}")
         print(f"跳过已存在数据: {skip_existing}")
+        print(f"后台写库: {pipeline}")
+
+        metrics = self.metrics
 
         # 1. 加载CSV
-        df = self.load_and_validate_csv()
+        with metrics.stage('read'):
+            df = self.load_and_validate_csv()
+        metrics.add_rows('read', len(df))
 
         if '合约代码' not in df.columns:
             raise ValueError("CSV文件必须包含'合约代码'列")
-
-        # 2. 按合约分组解析Bar数据
+        if '时间' not in df.columns:
+            raise ValueError("CSV文件必须包含'时间'列")
+
+        # 2. 按文件推断时间格式，整列解析一次，无法解析的行放入拒绝桶
+        # parse阶段包含时间解析，parse_datetime单独记录其中时间解析的耗时
+        parse_start = perf_counter()
+        with metrics.stage('parse_datetime', len(df)):
+            datetimes, formats = self.parse_datetime_column(df['时间'])
+        rejected = datetimes.isna().to_numpy()
+        print(f"\n时间格式: {formats}")
+
+        if rejected.any():
+            self.stats['datetime_rejects'] = int(rejected.sum())
+            metrics.reject('invalid_datetime', self.stats['datetime_rejects'])
+            self.stats['invalid_rows'] += self.stats['datetime_rejects']
+            samples = df['时间'][rejected].head(5).tolist()
+            print(f"  ⚠️  时间无法解析: {self.stats['datetime_rejects']} 行，示例: {samples}")
+
+        # 3. 按合约分组解析Bar数据
         contract_bars: Dict[str, List[BarData]] = {}
 
         print(f"\n解析数据并分组...")
-        for idx, row in df.iterrows():
-            # 显示进度
-            if idx % 10000 == 0 and idx > 0:
-                print(f"  已解析 {idx} 行...")
-
-            bar = self.parse_row_to_bar(row, idx)
-            if bar:
-                # 按symbol分组
-                if bar.symbol not in contract_bars:
-                    contract_bars[bar.symbol] = []
-                contract_bars[bar.symbol].append(bar)
+        if self.bulk_loader:
+            # 批量写入时按列解析，每个合约一个DataFrame
+            frame = self.parse_frame(df, datetimes, rejected)
+            contract_bars = {symbol: group for symbol, group in frame.groupby('symbol', sort=False)}
+        else:
+            dt_values = datetimes.array.to_pydatetime()
+            for (idx, row), dt, is_rejected in zip(df.iterrows(), dt_values, rejected):
+                # 显示进度
+                if idx % 10000 == 0 and idx > 0:
+                    print(f"  已解析 {idx} 行...")
+
+                if is_rejected:
+                    continue
+
+                bar = self.parse_row_to_bar(row, idx, dt)
+                if bar:
+                    # 按symbol分组
+                    if bar.symbol not in contract_bars:
+                        contract_bars[bar.symbol] = []
+                    contract_bars[bar.symbol].append(bar)
+
+        parsed_rows = sum(len(bars) for bars in contract_bars.values())
+        metrics.add_stage('parse', perf_counter() - parse_start, len(df))
+        metrics.reject('invalid_row', len(df) - int(rejected.sum()) - parsed_rows)
 
         print(f"解析完成，共 {len(contract_bars)} 个合约")
 
-        # 3. 对每个合约单独处理
+        # 4. 对每个合约单独处理
         total_saved = 0
+        writer_context = BackgroundWriter(self.save_bar_batch) if pipeline else nullcontext()
 
-        for symbol, bars in contract_bars.items():
-            print(f"\n处理合约: {symbol}")
-            print(f"  原始Bar数: {len(bars)}")
-
-            # 按时间排序
-            bars.sort(key=lambda x: x.datetime)
-
-            # 去重（相同datetime的Bar）
-            unique_bars = []
-            seen_times = set()
-
-            for bar in bars:
-                if bar.datetime not in seen_times:
-                    seen_times.add(bar.datetime)
-                    unique_bars.append(bar)
-
-            if len(unique_bars) < len(bars):
-                print(f"  去重后: {len(unique_bars)} 条（移除 {len(bars) - len(unique_bars)} 条重复）")
-
-            bars = unique_bars
-
-            # 跳过已存在数据（如果需要）
-            if skip_existing and bars:
-                # 查询该合约的现有数据时间范围
-                existing_bars = self.database.load_bar_data(
-                    symbol=symbol,
-                    exchange=self.exchange,
-                    interval=self.interval,
-                    start=bars[0].datetime,
-                    end=bars[-1].datetime
-                )
-
-                if existing_bars:
-                    existing_times = {b.datetime for b in existing_bars}
-                    new_bars = [b for b in bars if b.datetime not in existing_times]
-                    print(f"  已存在: {len(existing_bars)} 条，新增: {len(new_bars)} 条")
-                    bars = new_bars
+        with writer_context as writer:
+            for symbol, bars in contract_bars.items():
+                print(f"\n处理合约: {symbol}")
+                print(f"  原始Bar数: {len(bars)}")
 
-            if not bars:
-                print(f"  ⚠️  没有需要导入的新数据")
-                continue
+                # 按时间排序并去重（相同datetime的Bar）
+                with metrics.stage('dedupe', len(bars)):
+                    unique_bars = self.sort_and_dedupe(bars)
 
-            # 4. 按合约分批保存
-            print(f"  准备保存 {len(bars)} 条Bar数据...")
-            contract_saved = 0
+                if len(unique_bars) < len(bars):
+                    print(f"  去重后: {len(unique_bars)} 条（移除 {len(bars) - len(unique_bars)} 条重复）")
+                    metrics.reject('duplicate', len(bars) - len(unique_bars))
 
-            for i in range(0, len(bars), batch_size):
-                batch = bars[i:i + batch_size]
+                bars = unique_bars
 
-                try:
+                # 跳过已存在数据（如果需要）
+                if skip_existing and len(bars):
+                    with metrics.stage('skip_existing', len(bars)):
+                        new_bars = self.skip_existing_bars(symbol, bars)
+                    metrics.reject('existing', len(bars) - len(new_bars))
+                    bars = new_bars
+
+                if not len(bars):
+                    print(f"  ⚠️  没有需要导入的新数据")
+                    continue
+
+                # 5. 按合约分批保存
+                print(f"  准备保存 {len(bars)} 条Bar数据...")
+                contract_saved = 0
+
+                save_start = perf_counter()
+                for i in range(0, len(bars), batch_size):
                     # ✅ 关键修复：每个批次只包含同一个合约的数据
-                    self.database.save_bar_data(batch)
-                    contract_saved += len(batch)
+                    batch = bars[i:i + batch_size]
+
+                    if writer is not None:
+                        # 实际写入耗时由写入线程记入save阶段
+                        writer.submit(batch, metrics=metrics)
+                        continue
+
+                    contract_saved += self.save_bar_batch(batch)
 
                     if (i // batch_size) % 10 == 0:  # 每10批显示一次进度
                         print(f"    批次 {i // batch_size + 1}: 已保存 {min(i + batch_size, len(bars))}/{len(bars)}")
 
-                except Exception as e:
-                    print(f"    ❌ 批次 {i // batch_size + 1} 保存失败: {e}")
-                    # 尝试逐条保存以找出问题Bar
-                    for j, bar in enumerate(batch):
-                        try:
-                            self.database.save_bar_data([bar])
-                            contract_saved += 1
-                        except Exception as single_error:
-                            print(f"      行 {i + j} 失败: {single_error}")
-                            print(f"      失败Bar: {bar.symbol} {bar.datetime} {bar.close_price}")
+                save_stage = 'save_wait' if writer is not None else 'save'
+                metrics.add_stage(save_stage, perf_counter() - save_start, len(bars))
 
-            total_saved += contract_saved
-            print(f"  ✅ 合约 {symbol} 保存完成: {contract_saved} 条")
+                if writer is not None:
+                    print(f"  ✅ 合约 {symbol} 已提交后台写入: {len(bars)} 条")
+                    continue
+
+                total_saved += contract_saved
+                print(f"  ✅ 合约 {symbol} 保存完成: {contract_saved} 条")
+
+                # 验证保存的数据
+                # self._verify_saved_data(symbol, contract_saved)
 
-            # 验证保存的数据
-            # self._verify_saved_data(symbol, contract_saved)
+        # 后台写入时，退出with已等待队列写完，保存条数由写入线程累计
+        if pipeline:
+            total_saved = writer.saved
 
-        # 5. 更新统计信息
+        if self.reject_writer:
+            self.reject_writer.close()
+
+        # 6. 更新统计信息
         self.stats['saved_bars'] = total_saved
         self.stats['unique_symbols'] = set(contract_bars.keys())
+        self.stats['metrics'] = metrics.to_dict()
+        write_metrics_log(self.metrics_log, {
+            'event': 'bar_import',
+            'file': str(self.file_path),
+            'total_rows': self.stats['total_rows'],
+            'valid_rows': self.stats['valid_rows'],
+            'invalid_rows': self.stats['invalid_rows'],
+            'saved_bars': total_saved,
+            **self.stats['metrics'],
+        })
 
         print(f"\n✅ 数据导入完成")
         print(f"   总保存Bar数: {total_saved} 条")
@@ -373,6 +469,175 @@ class CFFEXMinuteBarImporter:
 
         return self.stats
 
+    def parse_frame(self, df: pd.DataFrame, datetimes: pd.Series, rejected: np.ndarray) -> pd.DataFrame:
+        """
+        按列解析Bar数据，规则与parse_row_to_bar相同
+
+        返回symbol、datetime以及BarData数值字段同名列的DataFrame，
+        合约代码无效或必需数值无法转换的行被丢弃
+        """
+        frame = pd.DataFrame({'datetime': datetimes}, index=df.index)
+
+        # 合约代码：每个不同的值只校验一次
+        codes, uniques = pd.factorize(df['合约代码'])
+        valid_symbols = np.array([self.validate_symbol(u) for u in uniques] + [None], dtype=object)
+        frame['symbol'] = valid_symbols[codes]
+        bad_symbol = frame['symbol'].isna() & ~rejected
+        if bad_symbol.any():
+            print(f"  无效的合约代码: {int(bad_symbol.sum())} 行，"
+                  f"示例: {df['合约代码'][bad_symbol].head(5).tolist()}")
+
+        # 必需数值字段：空值保留为NaN（与float(nan)一致），无法转换的行丢弃
+        invalid = frame['symbol'].isna().to_numpy() | rejected
+        for column, attr in [('开盘价', 'open_price'), ('最高价', 'high_price'), ('最低价', 'low_price'),
+                             ('收盘价', 'close_price'), ('成交量', 'volume')]:
+            if column not in df.columns:
+                frame[attr] = 0.0
+                continue
+            values = pd.to_numeric(df[column], errors='coerce')
+            invalid |= (values.isna() & df[column].notna()).to_numpy()
+            frame[attr] = values
+
+        # 可选字段：成交额无法转换时按成交量*收盘价估算，持仓量无法转换时为0
+        frame['turnover'] = 0.0
+        if '成交额' in df.columns:
+            turnover = pd.to_numeric(df['成交额'], errors='coerce')
+            estimated = frame['volume'] * frame['close_price']
+            frame['turnover'] = turnover.where(turnover.notna() | df['成交额'].isna(), estimated).fillna(0.0)
+
+        frame['open_interest'] = 0.0
+        if '持仓量' in df.columns:
+            frame['open_interest'] = pd.to_numeric(df['持仓量'], errors='coerce').fillna(0.0)
+
+        frame = frame[~invalid]
+
+        # 更新统计信息
+        self.stats['valid_rows'] += len(frame)
+        self.stats['unique_symbols'].update(frame['symbol'].unique())
+        if not frame.empty:
+            start = frame['datetime'].min().to_pydatetime()
+            end = frame['datetime'].max().to_pydatetime()
+            if not self.stats['time_range']['start'] or start < self.stats['time_range']['start']:
+                self.stats['time_range']['start'] = start
+            if not self.stats['time_range']['end'] or end > self.stats['time_range']['end']:
+                self.stats['time_range']['end'] = end
+
+        return frame
+
+    def frame_to_bars(self, frame: pd.DataFrame) -> List[BarData]:
+        """将parse_frame的结果转换为BarData列表"""
+        attrs = [c for c in frame.columns if c not in ('symbol', 'datetime')]
+        datetimes = frame['datetime'].array.to_pydatetime()
+
+        return [
+            BarData(
+                gateway_name=self.gateway_name,
+                symbol=symbol,
+                exchange=self.exchange,
+                datetime=dt,
+                interval=self.interval,
+                **dict(zip(attrs, values))
+            )
+            for symbol, dt, *values in zip(frame['symbol'].tolist(), datetimes, *[frame[c].tolist() for c in attrs])
+        ]
+
+    def sort_and_dedupe(self, bars):
+        """按时间排序，相同datetime只保留第一条；bars为BarData列表或单合约的DataFrame"""
+        if isinstance(bars, pd.DataFrame):
+            bars = bars.sort_values('datetime', kind='stable')
+            return bars.drop_duplicates(subset='datetime', keep='first')
+
+        bars.sort(key=lambda x: x.datetime)
+
+        unique_bars = []
+        seen_times = set()
+
+        for bar in bars:
+            if bar.datetime not in seen_times:
+                seen_times.add(bar.datetime)
+                unique_bars.append(bar)
+
+        return unique_bars
+
+    def skip_existing_bars(self, symbol: str, bars):
+        """
+        去掉数据库中已存在的Bar；bars已按时间排序
+
+        新数据与已存在数据都转换为数据库时区的无时区时间后比较
+        （CSV解析出的时间无时区，load_bar_data返回的时间带数据库时区，不能直接比较）
+        """
+        if isinstance(bars, pd.DataFrame):
+            datetimes = bars['datetime']
+        else:
+            datetimes = pd.Series([b.datetime for b in bars])
+        db_times = SqliteBulkLoader.to_db_time(datetimes)
+
+        start, end = datetimes.iloc[0].to_pydatetime(), datetimes.iloc[-1].to_pydatetime()
+        existing_times = self.load_existing_times(symbol, start, end)
+        if not len(existing_times):
+            return bars
+
+        keep = ~np.isin(db_times.to_numpy(dtype='datetime64[us]'), existing_times)
+        if isinstance(bars, pd.DataFrame):
+            new_bars = bars[keep]
+        else:
+            new_bars = [b for b, k in zip(bars, keep) if k]
+
+        print(f"  已存在: {len(existing_times)} 条，新增: {len(new_bars)} 条")
+        return new_bars
+
+    def load_existing_times(self, symbol: str, start: datetime, end: datetime) -> np.ndarray:
+        """
+        查询start到end之间已存在的Bar时间（数据库时区的无时区datetime64[us]数组）
+
+        vnpy_sqlite只读取时间列；其他数据库通过load_bar_data加载后取时间
+        """
+        if self.time_index:
+            return self.time_index.load_bar_times(symbol, self.exchange, self.interval, start, end)
+
+        existing_bars = self.database.load_bar_data(
+            symbol=symbol,
+            exchange=self.exchange,
+            interval=self.interval,
+            start=start,
+            end=end
+        )
+        datetimes = pd.Series([b.datetime for b in existing_bars], dtype=object)
+        if datetimes.empty:
+            return np.array([], dtype='datetime64[us]')
+        return SqliteBulkLoader.to_db_time(pd.to_datetime(datetimes, utc=True)).to_numpy(dtype='datetime64[us]')
+
+    def save_bar_batch(self, batch) -> int:
+        """
+        保存一个批次，返回成功保存的条数
+
+        DataFrame批次在一个事务中批量写入，失败时整批回滚后转换为BarData写入。
+        BarData写入失败时对半拆分重试以找出问题Bar，其余Bar仍按批次写入；
+        问题Bar连同异常信息写入拒绝文件
+        """
+        start = perf_counter()
+
+        if isinstance(batch, pd.DataFrame):
+            try:
+                saved = self.bulk_loader.save_bar_frame(batch, self.exchange, self.interval)
+                self.metrics.observe('batch_commit', perf_counter() - start)
+                return saved
+            except Exception as e:
+                print(f"    ⚠️  批量写入失败，改用BarData写入: {e}")
+                self.metrics.count('bulk_fallbacks')
+                batch = self.frame_to_bars(batch)
+
+        saved = save_with_bisect(self.database.save_bar_data, batch, self.reject_bar)
+        self.metrics.observe('batch_commit', perf_counter() - start)
+        self.metrics.reject('save_error', len(batch) - saved)
+        return saved
+
+    def reject_bar(self, bar: BarData, error: Exception) -> None:
+        """记录保存失败的Bar"""
+        print(f"      失败Bar: {bar.symbol} {bar.datetime} {bar.close_price}: {error}")
+        if self.reject_writer:
+            self.reject_writer.write(bar, error)
+
     def _verify_saved_data(self, symbol: str, expected_count: int):
         """验证保存的数据"""
         try:
@@ -410,6 +675,8 @@ class CFFEXMinuteBarImporter:
         print(f"总行数: {self.stats['total_rows']}")
         print(f"有效行数: {self.stats['valid_rows']}")
         print(f"无效行数: {self.stats['invalid_rows']}")
+        if self.stats['datetime_rejects']:
+            print(f"时间无法解析: {self.stats['datetime_rejects']}")
 
         if self.stats['unique_symbols']:
             print(f"合约数量: {len(self.stats['unique_symbols'])}")
@@ -419,6 +686,12 @@ class CFFEXMinuteBarImporter:
             print(f"时间范围: {self.stats['time_range']['start']} 到 {self.stats['time_range']['end']}")
 
         print(f"保存Bar数: {self.stats['saved_bars']}")
+        if self.reject_writer and self.reject_writer.count:
+            print(f"保存失败Bar数: {self.reject_writer.count}，已写入 {self.reject_writer.file_path}")
+        if self.stats.get('metrics'):
+            print(f"阶段耗时: {format_stages(self.stats['metrics'])}")
+            if self.stats['metrics']['rejects']:
+                print(f"拒绝原因: {self.stats['metrics']['rejects']}")
         print("=" * 60)
 
     def verify_import(self, sample_symbol: str = None) -> List[BarData]:
@@ -472,21 +745,28 @@ def main():
     import sys
 
     parser = argparse.ArgumentParser(description='导入CFFEX多合约分钟Bar数据到vn.py数据库')
-    parser.add_argument('--file', type=str, required=True, help='CSV文件路径')
+    parser.add_argument('--file', type=str, required=True, help='CSV文件路径（支持.gz、.zst压缩文件和包含多个CSV的.zip压缩包）')
     parser.add_argument('--batch-size', type=int, default=10000, help='批处理大小')
     parser.add_argument('--no-skip', action='store_true', help='不跳过已存在的数据（默认跳过）')
     parser.add_argument('--verify', action='store_true', help='导入后验证数据')
+    parser.add_argument('--pipeline', action='store_true', help='使用后台线程写库，处理与写入重叠进行')
+    parser.add_argument('--bulk', action='store_true', help='按列解析，不构造BarData，直接批量写入vnpy_sqlite数据表')
+    parser.add_argument('--metrics-log', type=str, default=None, help='分阶段统计追加写入的JSON-lines日志文件')
+    parser.add_argument('--reject-file', type=str, default='bar_import_rejects.csv',
+                        help='保存失败的Bar及异常信息写入的CSV文件')
 
     args = parser.parse_args()
 
     try:
         # 创建导入器
-        importer = CFFEXMinuteBarImporter(args.file)
+        importer = CFFEXMinuteBarImporter(args.file, reject_file=args.reject_file, bulk=args.bulk,
+                                          metrics_log=args.metrics_log)
 
         # 导入数据
         stats = importer.import_data(
             batch_size=args.batch_size,
-            skip_existing=not args.no_skip
+            skip_existing=not args.no_skip,
+            pipeline=args.pipeline
         )
 
         # 验证数据（可选）
@@ -6,17 +6,43 @@ vn.py 4.2版本 - 将包含多个CFFEX合约的Tick数据CSV导入数据库
 """
 import pandas as pd
 import numpy as np
+from contextlib import nullcontext
 from datetime import datetime, time
+from functools import partial
 from pathlib import Path
+from time import perf_counter
 from typing import List, Dict, Set, Optional, Tuple
 from vnpy.trader.constant import Exchange, Direction, Offset
 from vnpy.trader.object import TickData
 from vnpy.trader.database import BaseDatabase, get_database
+from vnpy.trader.utility import get_file_path
+
+from bulk_loader import SqliteBulkLoader
+from import_manifest import ImportManifest
+from import_metrics import ImportMetrics, format_stages, write_metrics_log
+from preprocess_tick_data import convert_datetime_columns, iter_raw_files
+from tick_store import STORE_SUFFIX, iter_tick_store, list_partitions, read_tick_store
+from import_utils import (
+    BackgroundWriter,
+    ChunkDeduplicator,
+    RejectWriter,
+    EncodingCache,
+    expand_csv_sources,
+    iter_csv_chunks,
+    list_csv_sources,
+    parse_datetime_column,
+    read_csv_encodings,
+    read_csv_sniffed,
+    save_with_bisect,
+)
 
 
 class CFFEXTickDataImporterFixed:
     """CFFEX交易所多合约Tick数据导入器 (修复版)"""
 
+    # 候选文件编码（按优先级排列）
+    ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig']
+
     # CSV列名到TickData属性名的映射
     TICK_FIELDS = {
         # 必需字段
@@ -68,11 +94,53 @@ class CFFEXTickDataImporterFixed:
         'SettlementPrice': 'settlement_price',
     }
 
-    def __init__(self):
-        """初始化导入器"""
+    # 支持的时间格式（按优先级排列）
+    DATETIME_FORMATS = [
+        '%Y-%m-%d %H:%M:%S.%f',
+        '%Y/%m/%d %H:%M:%S.%f',
+        '%Y%m%d %H:%M:%S.%f',
+        '%Y-%m-%d %H:%M:%S',
+        '%Y/%m/%d %H:%M:%S',
+        '%Y%m%d %H:%M:%S',
+        '%Y-%m-%d %H:%M',
+        '%Y/%m/%d %H:%M',
+        '%Y%m%d %H:%M',
+    ]
+
+    def __init__(self, connect_database: bool = True, reject_file: Optional[str] = None,
+                 manifest_file: Optional[str] = None, bulk: bool = False, metrics_log: Optional[str] = None,
+                 raw_times: bool = False):
+        """
+        初始化导入器
+
+        Args:
+            connect_database: 是否连接数据库，只做解析的子进程传False
+            reject_file: 保存失败的Tick连同异常信息写入的CSV文件，None表示不记录
+            manifest_file: 导入清单数据库路径，None表示不使用清单
+            bulk: 列式解析结果不构造TickData，直接批量写入vnpy_sqlite数据表
+            metrics_log: 每个文件导入结束后追加写入分阶段统计的JSON-lines日志，None表示不写
+            raw_times: 输入为未经预处理的原始文件，时间由TradingDay和时分秒格式的UpdateTime
+                合并得到（与preprocess_tick_data规则相同），只解析一次且不生成中间CSV
+        """
         self.exchange = Exchange.CFFEX
         self.gateway_name = "TICK_CSV_IMPORT"
-        self.database: BaseDatabase = get_database()
+        self.database: Optional[BaseDatabase] = get_database() if connect_database else None
+        self.reject_writer: Optional[RejectWriter] = None
+        if reject_file:
+            # 映射中不属于TickData字段的属性（如settlement_price）只在非0时设置，拒绝文件固定保留这些列
+            extra_fields = [a for a in self.TICK_FIELDS.values() if a not in TickData.__dataclass_fields__]
+            self.reject_writer = RejectWriter(reject_file, extra_fields=extra_fields)
+        self.manifest: Optional[ImportManifest] = ImportManifest(manifest_file) if manifest_file else None
+        self.metrics_log = metrics_log
+        self.raw_times = raw_times
+        self.encoding_cache = EncodingCache(self.ENCODINGS)
+
+        self.bulk_loader: Optional[SqliteBulkLoader] = None
+        if bulk and self.database is not None:
+            if SqliteBulkLoader.is_supported(self.database):
+                self.bulk_loader = SqliteBulkLoader(self.database)
+            else:
+                print(f"⚠️  批量写入仅支持vnpy_sqlite，当前数据库为 {type(self.database).__name__}，使用TickData写入")
 
     def parse_datetime(self, dt_str: str) -> Optional[datetime]:
         """解析时间字符串为datetime对象"""
@@ -84,19 +152,7 @@ class CFFEXTickDataImporterFixed:
             return None
 
         # 尝试多种时间格式
-        date_formats = [
-            '%Y-%m-%d %H:%M:%S.%f',
-            '%Y/%m/%d %H:%M:%S.%f',
-            '%Y%m%d %H:%M:%S.%f',
-            '%Y-%m-%d %H:%M:%S',
-            '%Y/%m/%d %H:%M:%S',
-            '%Y%m%d %H:%M:%S',
-            '%Y-%m-%d %H:%M',
-            '%Y/%m/%d %H:%M',
-            '%Y%m%d %H:%M',
-        ]
-
-        for fmt in date_formats:
+        for fmt in self.DATETIME_FORMATS:
             try:
                 return datetime.strptime(dt_str, fmt)
             except ValueError:
@@ -110,6 +166,14 @@ class CFFEXTickDataImporterFixed:
         except:
             return None
 
+    def parse_datetime_column(self, values: pd.Series) -> Tuple[pd.Series, List[str]]:
+        """
+        按列解析时间：每个文件抽样推断一次格式，再整列向量化解析
+
+        无法解析的行返回NaT（不再回退为日期+9:30）
+        """
+        return parse_datetime_column(values, self.DATETIME_FORMATS)
+
     def validate_symbol(self, symbol: str) -> Optional[str]:
         """验证并清理合约代码"""
         if pd.isna(symbol) or not isinstance(symbol, str):
@@ -127,6 +191,13 @@ class CFFEXTickDataImporterFixed:
             return symbol
         return None
 
+    def validate_symbol_column(self, values: pd.Series) -> pd.Series:
+        """按列验证合约代码，每个不同的代码只验证一次，无效代码返回None"""
+        codes, uniques = pd.factorize(values)
+        cleaned = np.array([self.validate_symbol(v) for v in uniques] + [None], dtype=object)
+        # factorize对缺失值返回-1，正好对应末尾的None
+        return pd.Series(cleaned[codes], index=values.index)
+
     def parse_row_to_tick(self, row: pd.Series, index: int, field_mapping: Dict) -> Optional[TickData]:
         """
         将一行数据解析为TickData对象
@@ -195,6 +266,105 @@ class CFFEXTickDataImporterFixed:
         except Exception:
             return None
 
+    def parse_frame(self, df: pd.DataFrame, field_mapping: Dict, stats: Optional[Dict] = None) -> pd.DataFrame:
+        """
+        列式解析：整列完成校验和转换，规则与parse_row_to_tick一致
+
+        返回的DataFrame每列对应一个TickData属性（含symbol和datetime），无效行已剔除。
+        传入stats时，时间无法解析的行数和示例会记录到拒绝桶统计中
+        """
+        metrics: ImportMetrics = stats['metrics'] if stats is not None else ImportMetrics()
+
+        with metrics.stage('parse_datetime', len(df)):
+            if pd.api.types.is_datetime64_any_dtype(df['UpdateTime']):
+                # Parquet存储中的时间已是时间类型
+                datetimes, formats = df['UpdateTime'], []
+            elif self.raw_times:
+                datetimes, formats = convert_datetime_columns(df['TradingDay'], df['UpdateTime']), []
+            else:
+                datetimes, formats = self.parse_datetime_column(df['UpdateTime'])
+        if stats is not None:
+            rejected = df['UpdateTime'][datetimes.isna() & df['UpdateTime'].notna()]
+            used_formats = stats.setdefault('datetime_formats', [])
+            used_formats.extend(fmt for fmt in formats if fmt not in used_formats)
+            stats['datetime_rejects'] = stats.get('datetime_rejects', 0) + len(rejected)
+            samples = stats.setdefault('datetime_reject_samples', [])
+            samples.extend(rejected.head(5 - len(samples)).astype(str).tolist())
+
+        columns = {
+            'symbol': self.validate_symbol_column(df['InstrumentID']),
+            'datetime': datetimes,
+        }
+
+        # 数值字段：无法转换或为0都视为缺失，保持默认值0
+        for csv_col, tick_attr in field_mapping.items():
+            if tick_attr in columns or csv_col not in df.columns:
+                continue
+            values = pd.to_numeric(df[csv_col], errors='coerce').astype('float64')
+            columns[tick_attr] = values.fillna(0.0)
+
+        frame = pd.DataFrame(columns, index=df.index)
+        for tick_attr in ('last_price', 'bid_price_1', 'ask_price_1', 'bid_volume_1', 'ask_volume_1'):
+            if tick_attr not in frame.columns:
+                frame[tick_attr] = 0.0
+
+        # 合约代码和时间为必需字段
+        has_symbol = frame['symbol'].notna()
+        has_datetime = frame['datetime'].notna()
+        metrics.reject('invalid_symbol', int((~has_symbol).sum()))
+        metrics.reject('invalid_datetime', int((has_symbol & ~has_datetime).sum()))
+        frame = frame[has_symbol & has_datetime]
+
+        # 最新价为0时依次用买一价、卖一价替代，都无效则丢弃
+        last = frame['last_price'].to_numpy()
+        bid_1 = frame['bid_price_1'].to_numpy()
+        ask_1 = frame['ask_price_1'].to_numpy()
+        last = np.where(last != 0, last, np.where(bid_1 > 0, bid_1, np.where(ask_1 > 0, ask_1, 0.0)))
+        frame = frame.assign(last_price=last)
+        metrics.reject('no_price', int((last == 0).sum()))
+        frame = frame[last != 0].copy()
+
+        # 确保买卖盘口有有效值
+        last = frame['last_price'].to_numpy()
+        for price_attr in ('bid_price_1', 'ask_price_1'):
+            price = frame[price_attr].to_numpy()
+            frame[price_attr] = np.where(price != 0, price, last)
+        for volume_attr in ('bid_volume_1', 'ask_volume_1'):
+            volume = frame[volume_attr].to_numpy()
+            frame[volume_attr] = np.where(volume != 0, volume, 1.0)
+
+        return frame
+
+    def frame_to_ticks(self, frame: pd.DataFrame) -> List[TickData]:
+        """将parse_frame的结果转换为TickData列表"""
+        tick_fields = set(TickData.__dataclass_fields__)
+        value_attrs = [c for c in frame.columns if c not in ('symbol', 'datetime')]
+        init_attrs = [c for c in value_attrs if c in tick_fields]
+        # 映射中不属于TickData构造参数的字段（如settlement_price），非0时额外设置
+        extra_attrs = [c for c in value_attrs if c not in tick_fields]
+
+        symbols = frame['symbol'].tolist()
+        datetimes = frame['datetime'].array.to_pydatetime()
+        init_values = zip(*[frame[c].tolist() for c in init_attrs]) if init_attrs else ((),) * len(frame)
+        extra_values = zip(*[frame[c].tolist() for c in extra_attrs]) if extra_attrs else ((),) * len(frame)
+
+        ticks = []
+        for symbol, dt, values, extras in zip(symbols, datetimes, init_values, extra_values):
+            tick = TickData(
+                gateway_name=self.gateway_name,
+                symbol=symbol,
+                exchange=self.exchange,
+                datetime=dt,
+                name="",
+                **dict(zip(init_attrs, values))
+            )
+            for tick_attr, value in zip(extra_attrs, extras):
+                if value:
+                    setattr(tick, tick_attr, value)
+            ticks.append(tick)
+
+        return ticks
+
     def detect_field_mapping(self, df: pd.DataFrame) -> Dict[str, str]:
         """检测CSV字段并返回映射"""
         detected_mapping = {}
@@ -234,36 +404,91 @@ class CFFEXTickDataImporterFixed:
 
         return detected_mapping or self.TICK_FIELDS.copy()
 
-    def import_file(self, file_path: Path, batch_size: int = 10000) -> Dict:
-        """导入单个文件"""
-        if not file_path.exists():
-            return {'error': f"文件不存在: {file_path}"}
+    def check_columns(self, columns) -> Optional[str]:
+        """检查必需字段，缺少时返回错误信息"""
+        required = ['InstrumentID', 'UpdateTime'] + (['TradingDay'] if self.raw_times else [])
+        missing = [col for col in required if col not in columns]
+        if missing:
+            return f"CSV缺少必需字段({'或'.join(missing)})"
+        return None
 
-        # 统计信息
-        stats = {
+    def new_stats(self, file_path: Path) -> Dict:
+        """创建单个文件的统计信息"""
+        return {
             'file': str(file_path),
             'total_rows': 0,
             'valid_rows': 0,
             'invalid_rows': 0,
             'unique_symbols': set(),
             'saved_ticks': 0,
+            'metrics': ImportMetrics(),
         }
 
-        try:
-            # 读取CSV
-            encodings = ['utf-8', 'gbk', 'gb2312', 'utf-8-sig']
-            df = None
+    def read_csv(self, file_path: Path, metrics: Optional[ImportMetrics] = None,
+                 encodings: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        读取CSV，无法识别编码时返回None
 
-            for encoding in encodings:
+        encodings为已排好序的候选编码（如多进程模式下主进程抽样检测的结果）时直接按顺序尝试，
+        否则抽样检测编码（同目录文件优先使用上一个文件的编码）
+        """
+        if encodings is None:
+            df, _ = read_csv_sniffed(file_path, self.encoding_cache, metrics)
+            return df
+
+        df, encoding = read_csv_encodings(file_path, encodings, metrics)
+        if encoding:
+            self.encoding_cache.remember(file_path, encoding)
+        return df
+
+    def read_frame(self, file_path: Path, metrics: Optional[ImportMetrics] = None,
+                   encodings: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """读取单个文件：Parquet分区文件直接按类型读取，其他按CSV读取"""
+        if file_path.suffix == STORE_SUFFIX:
+            return read_tick_store([file_path])
+        return self.read_csv(file_path, metrics, encodings)
+
+    def import_file(self, file_path: Path, batch_size: int = 10000, vectorized: bool = True,
+                    pipeline: bool = False) -> Dict:
+        """
+        导入单个文件
+
+        Args:
+            file_path: CSV文件路径
+            batch_size: 批处理大小
+            vectorized: 是否使用列式解析（False时逐行解析）
+            pipeline: 列式解析时是否使用后台写库线程，构建Tick对象与写库重叠进行
+        """
+        if vectorized:
+            stats, frame = self.parse_file(file_path)
+            if frame is not None:
                 try:
-                    df = pd.read_csv(file_path, encoding=encoding)
-                    break
-                except UnicodeDecodeError:
-                    continue
+                    self.begin_file(file_path, stats)
+                    # 后台写库时实际写入耗时由写入线程记入save，这里只是提交和等待写完
+                    with stats['metrics'].stage('save_wait' if pipeline else 'save', len(frame)):
+                        with self.create_writer(batch_size) if pipeline else nullcontext() as writer:
+                            self.save_frame(frame, stats, batch_size, writer)
+                except Exception as e:
+                    stats['error'] = str(e)
+            self.finish_file(file_path, stats)
+            return stats
 
+        if not file_path.exists():
+            return {'error': f"文件不存在: {file_path}"}
+
+        # 统计信息
+        stats = self.new_stats(file_path)
+        metrics: ImportMetrics = stats['metrics']
+
+        try:
+            # 读取CSV
+            with metrics.stage('read'):
+                df = self.read_frame(file_path, metrics)
             if df is None:
                 stats['error'] = "无法识别文件编码"
+                self.finish_file(file_path, stats)
                 return stats
+            metrics.add_rows('read', len(df))
 
             stats['total_rows'] = len(df)
 
@@ -271,51 +496,47 @@ class CFFEXTickDataImporterFixed:
             field_mapping = self.detect_field_mapping(df)
 
             # 检查必需字段
-            if 'InstrumentID' not in df.columns or 'UpdateTime' not in df.columns:
-                stats['error'] = "CSV缺少必需字段(InstrumentID或UpdateTime)"
+            error = self.check_columns(df.columns)
+            if error:
+                stats['error'] = error
+                self.finish_file(file_path, stats)
                 return stats
 
+            self.begin_file(file_path, stats)
+
             # 解析数据
             contract_ticks: Dict[str, List[TickData]] = {}
 
-            for idx, row in df.iterrows():
-                tick = self.parse_row_to_tick(row, idx, field_mapping)
-                if tick:
-                    stats['valid_rows'] += 1
-                    stats['unique_symbols'].add(tick.symbol)
+            with metrics.stage('parse', len(df)):
+                for idx, row in df.iterrows():
+                    tick = self.parse_row_to_tick(row, idx, field_mapping)
+                    if tick:
+                        stats['valid_rows'] += 1
+                        stats['unique_symbols'].add(tick.symbol)
 
-                    if tick.symbol not in contract_ticks:
-                        contract_ticks[tick.symbol] = []
-                    contract_ticks[tick.symbol].append(tick)
-                else:
-                    stats['invalid_rows'] += 1
+                        if tick.symbol not in contract_ticks:
+                            contract_ticks[tick.symbol] = []
+                        contract_ticks[tick.symbol].append(tick)
+                    else:
+                        stats['invalid_rows'] += 1
+            metrics.reject('invalid_row', stats['invalid_rows'])
 
             # 保存数据
             total_saved = 0
             for symbol, ticks in contract_ticks.items():
                 # 去重
-                unique_ticks = []
-                seen = set()
-                for tick in ticks:
-                    key = (tick.symbol, tick.datetime)
-                    if key not in seen:
-                        seen.add(key)
-                        unique_ticks.append(tick)
-
-                # 分批保存
-                for i in range(0, len(unique_ticks), batch_size):
-                    batch = unique_ticks[i:i + batch_size]
-                    try:
-                        self.database.save_tick_data(batch)
-                        total_saved += len(batch)
-                    except Exception:
-                        # 尝试逐条保存
-                        for tick in batch:
-                            try:
-                                self.database.save_tick_data([tick])
-                                total_saved += 1
-                            except Exception:
-                                pass
+                with metrics.stage('dedupe', len(ticks)):
+                    unique_ticks = []
+                    seen = set()
+                    for tick in ticks:
+                        key = (tick.symbol, tick.datetime)
+                        if key not in seen:
+                            seen.add(key)
+                            unique_ticks.append(tick)
+                metrics.reject('duplicate', len(ticks) - len(unique_ticks))
+
+                with metrics.stage('save', len(unique_ticks)):
+                    total_saved += self.save_ticks(unique_ticks, batch_size, metrics)
 
             stats['saved_ticks'] = total_saved
             stats['unique_symbols'] = list(stats['unique_symbols'])
@@ -323,8 +544,366 @@ class CFFEXTickDataImporterFixed:
         except Exception as e:
             stats['error'] = str(e)
 
+        self.finish_file(file_path, stats)
+        return stats
+
+    def parse_file(self, file_path: Path,
+                   encodings: Optional[List[str]] = None) -> Tuple[Dict, Optional[pd.DataFrame]]:
+        """
+        读取并列式解析单个文件，不访问数据库
+
+        encodings为候选编码，None时抽样检测（规则同read_csv）
+
+        Returns:
+            (统计信息, 按(symbol, datetime)去重后的解析结果)，出错时解析结果为None
+        """
+        if not file_path.exists():
+            return {'error': f"文件不存在: {file_path}"}, None
+
+        stats = self.new_stats(file_path)
+        metrics: ImportMetrics = stats['metrics']
+
+        try:
+            with metrics.stage('read'):
+                df = self.read_frame(file_path, metrics, encodings)
+            if df is None:
+                stats['error'] = "无法识别文件编码"
+                return stats, None
+
+            stats['total_rows'] = len(df)
+            metrics.add_rows('read', len(df))
+
+            # 检查必需字段
+            error = self.check_columns(df.columns)
+            if error:
+                stats['error'] = error
+                return stats, None
+
+            field_mapping = self.detect_field_mapping(df)
+            with metrics.stage('parse', len(df)):
+                frame = self.parse_frame(df, field_mapping, stats)
+            stats['valid_rows'] = len(frame)
+            stats['invalid_rows'] = len(df) - len(frame)
+
+            with metrics.stage('dedupe', len(frame)):
+                deduped = frame.drop_duplicates(subset=['symbol', 'datetime'], keep='first')
+            metrics.reject('duplicate', len(frame) - len(deduped))
+            frame = deduped
+
+            stats['unique_symbols'] = frame['symbol'].unique().tolist()
+            self.update_time_range(stats, frame)
+            return stats, frame
+
+        except Exception as e:
+            stats['error'] = str(e)
+            return stats, None
+
+    def save_frame(self, frame: pd.DataFrame, stats: Dict, batch_size: int = 10000,
+                   writer: Optional[BackgroundWriter] = None) -> None:
+        """
+        按合约分组保存parse_file的解析结果，保存条数累加到stats
+
+        传入writer时只把批次提交给后台写库线程，保存条数在写入完成后回调累加。
+        stats中有续传进度时，跳过各合约上次已提交的行（同一文件的解析顺序是确定的）
+        """
+        resume_rows = stats.get('resume_rows', {})
+        routed_rows = stats.setdefault('routed_rows', {})
+        metrics: ImportMetrics = stats['metrics']
+
+        for symbol, group in frame.groupby('symbol', sort=False):
+            start = routed_rows.get(symbol, 0)
+            routed_rows[symbol] = start + len(group)
+
+            skip = min(max(resume_rows.get(symbol, 0) - start, 0), len(group))
+            if skip:
+                group = group.iloc[skip:]
+
+            # 批量写入直接使用DataFrame切片，否则转换为TickData列表
+            if self.bulk_loader:
+                records = group
+            else:
+                with metrics.stage('build_ticks', len(group)):
+                    records = self.frame_to_ticks(group)
+
+            for i in range(0, len(records), batch_size):
+                batch = records[i:i + batch_size]
+                on_saved = partial(self.batch_saved, stats, symbol, len(batch))
+
+                if writer is None:
+                    on_saved(self.save_batch(batch, batch_size, metrics))
+                else:
+                    writer.submit((batch, metrics), on_saved, metrics=metrics, rows=len(batch))
+
+    def batch_saved(self, stats: Dict, symbol: str, batch_rows: int, saved_rows: int) -> None:
+        """一个批次写入完成：累加保存条数，并在清单中记录续传进度"""
+        stats['saved_ticks'] += saved_rows
+        if self.manifest:
+            self.manifest.add_progress(Path(stats['file']), symbol, batch_rows, saved_rows)
+
+    def begin_file(self, file_path: Path, stats: Dict) -> None:
+        """开始保存文件，从清单读取上次中断时各合约已提交的行数"""
+        stats['resume_rows'] = self.manifest.begin(file_path) if self.manifest else {}
+        if stats['resume_rows']:
+            print(f"  从上次中断处继续: 已提交 {sum(stats['resume_rows'].values())} 行")
+
+    def finish_file(self, file_path: Path, stats: Dict) -> None:
+        """
+        文件导入结束：成功时在清单中标记完成；分阶段统计转换为字典，
+        并追加写入JSON-lines日志
+        """
+        if self.manifest and 'error' not in stats:
+            self.manifest.finish(file_path, stats)
+
+        metrics = stats.get('metrics')
+        if isinstance(metrics, ImportMetrics):
+            stats['metrics'] = metrics.to_dict()
+            write_metrics_log(self.metrics_log, {
+                'event': 'tick_import',
+                'file': stats['file'],
+                'error': stats.get('error'),
+                'total_rows': stats['total_rows'],
+                'valid_rows': stats['valid_rows'],
+                'invalid_rows': stats['invalid_rows'],
+                'saved_ticks': stats['saved_ticks'],
+                **stats['metrics'],
+            })
+
+    def update_time_range(self, stats: Dict, frame: pd.DataFrame) -> None:
+        """用解析结果更新统计信息中的时间范围"""
+        if frame.empty:
+            return
+
+        start = frame['datetime'].min().to_pydatetime()
+        end = frame['datetime'].max().to_pydatetime()
+        if stats.get('start') is None or start < stats['start']:
+            stats['start'] = start
+        if stats.get('end') is None or end > stats['end']:
+            stats['end'] = end
+
+    def create_writer(self, batch_size: int = 10000) -> BackgroundWriter:
+        """创建后台写库线程"""
+        return BackgroundWriter(lambda task: self.save_batch(task[0], batch_size, task[1]))
+
+    def import_file_chunked(self, file_path: Path, batch_size: int = 10000, chunk_size: int = 500000,
+                            pipeline: bool = False) -> Dict:
+        """
+        流式导入单个文件：按chunk_size行分块读取，每块解析、去重后立即保存
+
+        峰值内存由chunk_size决定而不是文件大小；跨分块的同合约重复时间戳
+        由ChunkDeduplicator过滤，与整文件导入一样保留首次出现的行。
+        pipeline为True时由后台线程写库，读取解析下一块与写入上一块同时进行。
+
+        编码只抽样检测，文件只读取一遍；样本没有覆盖到的部分解码失败时，换下一个候选编码
+        从头重新读取，已提交的行按续传进度跳过（没有清单时重复写入，按主键覆盖，结果相同）
+        """
+        if not file_path.exists():
+            return {'error': f"文件不存在: {file_path}"}
+
+        # 统计信息
+        stats = self.new_stats(file_path)
+        stats['chunks'] = 0
+        metrics: ImportMetrics = stats['metrics']
+
+        try:
+            if file_path.suffix == STORE_SUFFIX:
+                encodings = [None]
+            else:
+                with metrics.stage('detect_encoding'):
+                    encodings = self.encoding_cache.ordered(file_path)
+
+            for encoding in encodings:
+                self.begin_file(file_path, stats)
+                try:
+                    self.import_chunks(file_path, encoding, stats, batch_size, chunk_size, pipeline)
+                except UnicodeDecodeError:
+                    metrics.count('encoding_retries')
+                    # 重新读取时行数重新统计；有清单时已提交的行按续传跳过，已保存条数保留，
+                    # 没有清单时这些行会重新写入，已保存条数也重新统计
+                    stats.update(total_rows=0, valid_rows=0, invalid_rows=0, chunks=0)
+                    stats.pop('routed_rows', None)
+                    if not self.manifest:
+                        stats['saved_ticks'] = 0
+                    continue
+
+                if encoding is not None:
+                    self.encoding_cache.remember(file_path, encoding)
+                break
+            else:
+                stats['error'] = "无法识别文件编码"
+
+            stats['unique_symbols'] = list(stats['unique_symbols'])
+
+        except Exception as e:
+            stats['error'] = str(e)
+
+        self.finish_file(file_path, stats)
         return stats
 
+    def import_chunks(self, file_path: Path, encoding: Optional[str], stats: Dict, batch_size: int,
+                      chunk_size: int, pipeline: bool) -> None:
+        """按指定编码分块读取、解析并保存整个文件，解码失败时抛出UnicodeDecodeError"""
+        metrics: ImportMetrics = stats['metrics']
+        if file_path.suffix == STORE_SUFFIX:
+            reader = iter_tick_store(file_path, chunk_size)
+        else:
+            reader = iter_csv_chunks(file_path, chunk_size, encoding=encoding)
+
+        deduplicator = ChunkDeduplicator()
+        field_mapping = None
+
+        with self.create_writer(batch_size) if pipeline else nullcontext() as writer:
+            for chunk in metrics.timed_iter('read', reader):
+                if field_mapping is None:
+                    # 检查必需字段
+                    error = self.check_columns(chunk.columns)
+                    if error:
+                        stats['error'] = error
+                        break
+                    field_mapping = self.detect_field_mapping(chunk)
+
+                stats['chunks'] += 1
+                stats['total_rows'] += len(chunk)
+
+                with metrics.stage('parse', len(chunk)):
+                    frame = self.parse_frame(chunk, field_mapping, stats)
+                stats['valid_rows'] += len(frame)
+                stats['invalid_rows'] += len(chunk) - len(frame)
+                del chunk
+
+                with metrics.stage('dedupe', len(frame)):
+                    deduped = deduplicator.dedupe(frame)
+                metrics.reject('duplicate', len(frame) - len(deduped))
+                frame = deduped
+
+                stats['unique_symbols'].update(frame['symbol'].unique())
+                self.update_time_range(stats, frame)
+                with metrics.stage('save_wait' if writer is not None else 'save', len(frame)):
+                    self.save_frame(frame, stats, batch_size, writer)
+
+    def save_batch(self, batch, batch_size: int, metrics: Optional[ImportMetrics] = None) -> int:
+        """保存一个批次：DataFrame批量写入，TickData列表按对象写入"""
+        if isinstance(batch, pd.DataFrame):
+            return self.save_tick_frame(batch, batch_size, metrics)
+        return self.save_ticks(batch, batch_size, metrics)
+
+    def save_tick_frame(self, frame: pd.DataFrame, batch_size: int,
+                        metrics: Optional[ImportMetrics] = None) -> int:
+        """
+        批量写入parse_frame的结果，返回成功保存的条数
+
+        批量写入在一个事务中完成，失败时整批回滚，再转换为TickData逐批写入以定位问题Tick
+        """
+        try:
+            start = perf_counter()
+            saved = self.bulk_loader.save_tick_frame(frame, self.exchange)
+            if metrics:
+                metrics.observe('batch_commit', perf_counter() - start)
+            return saved
+        except Exception as e:
+            print(f"  ⚠️  批量写入失败，改用TickData写入: {e}")
+            if metrics:
+                metrics.count('bulk_fallbacks')
+            return self.save_ticks(self.frame_to_ticks(frame), batch_size, metrics)
+
+    def save_ticks(self, ticks: List[TickData], batch_size: int, metrics: Optional[ImportMetrics] = None) -> int:
+        """
+        分批保存同一合约的Tick数据，返回成功保存的条数
+
+        批次保存失败时对半拆分重试，最终仍失败的Tick写入拒绝文件
+        """
+        on_reject = self.reject_writer.write if self.reject_writer else None
+
+        saved = 0
+        for i in range(0, len(ticks), batch_size):
+            batch = ticks[i:i + batch_size]
+            start = perf_counter()
+            batch_saved = save_with_bisect(self.database.save_tick_data, batch, on_reject)
+            if metrics:
+                metrics.observe('batch_commit', perf_counter() - start)
+                metrics.reject('save_error', len(batch) - batch_saved)
+            saved += batch_saved
+        return saved
+
+
+def parse_file_in_worker(file_path: Path, raw_times: bool = False,
+                         encodings: Optional[List[str]] = None) -> Tuple[Dict, Optional[pd.DataFrame]]:
+    """
+    子进程入口：只解析文件，不连接数据库
+
+    encodings为主进程按目录缓存抽样检测出的候选编码；实际使用的编码放在stats['encoding']，
+    由主进程记入缓存
+    """
+    importer = CFFEXTickDataImporterFixed(connect_database=False, raw_times=raw_times)
+    stats, frame = importer.parse_file(file_path, encodings)
+    stats['encoding'] = importer.encoding_cache.get(file_path)
+    return stats, frame
+
+
+def import_files_parallel(importer: CFFEXTickDataImporterFixed, files: List[Path],
+                          workers: int, batch_size: int = 10000, pipeline: bool = False) -> List[Dict]:
+    """
+    多进程导入多个文件
+
+    子进程并行解析，解析结果按文件顺序交回主进程，由主进程唯一的数据库连接写入，
+    规避SQLite同一时间只允许一个写入者的限制，写入顺序也与串行导入一致。
+    同时在途的文件数限制为workers的2倍，避免写入跟不上时解析结果堆满内存。
+    pipeline为True时主进程构建Tick对象与后台线程写库重叠进行
+    """
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    all_stats = []
+    pending = deque()
+    file_iter = iter(enumerate(files, 1))
+
+    writer_context = importer.create_writer(batch_size) if pipeline else nullcontext()
+    with ProcessPoolExecutor(max_workers=workers) as executor, writer_context as writer:
+        def submit_next() -> None:
+            item = next(file_iter, None)
+            if not item:
+                return
+
+            i, file_path = item
+            # 编码在主进程抽样检测，子进程共用主进程的目录编码缓存
+            encodings = None
+            if file_path.suffix != STORE_SUFFIX and file_path.exists():
+                encodings = importer.encoding_cache.ordered(file_path)
+            future = executor.submit(parse_file_in_worker, file_path, importer.raw_times, encodings)
+            pending.append((i, file_path, future))
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        while pending:
+            i, file_path, future = pending.popleft()
+            try:
+                stats, frame = future.result()
+            except Exception as e:
+                stats, frame = {'file': str(file_path), 'error': str(e)}, None
+            if stats.get('encoding'):
+                importer.encoding_cache.remember(file_path, stats['encoding'])
+
+            # 先补充任务，主进程写库时子进程继续解析
+            submit_next()
+
+            print(f"\n[{i}/{len(files)}] 写入文件: {file_path.name}")
+            if frame is not None:
+                try:
+                    importer.begin_file(file_path, stats)
+                    with stats['metrics'].stage('save_wait' if writer is not None else 'save', len(frame)):
+                        importer.save_frame(frame, stats, batch_size, writer)
+                except Exception as e:
+                    stats['error'] = str(e)
+
+            if writer is None or frame is None:
+                importer.finish_file(file_path, stats)
+            else:
+                # 空批次作为标记：该文件之前的批次都写完后才标记完成
+                writer.submit(([], None), lambda _, s=stats, f=file_path: importer.finish_file(f, s))
+            all_stats.append(stats)
+
+    return all_stats
+
 
 def main():
     """主函数"""
@@ -332,38 +911,113 @@ def main():
     import sys
 
     parser = argparse.ArgumentParser(description='导入CFFEX多合约Tick数据到vn.py数据库')
-    parser.add_argument('--path', type=str, required=True, help='CSV文件路径或包含CSV文件的文件夹路径')
+    parser.add_argument('--path', type=str, required=True,
+                        help='CSV文件路径或包含CSV文件的文件夹路径，支持.gz、.zst和包含多个CSV的.zip'
+                             '（--raw-tree、--store时为数据根目录）')
     parser.add_argument('--batch-size', type=int, default=10000, help='批处理大小')
+    parser.add_argument('--row-mode', action='store_true', help='逐行解析（旧逻辑，默认使用列式解析）')
+    parser.add_argument('--chunk-size', type=int, default=0,
+                        help='流式导入的分块行数，内存受限时使用（默认0表示整文件读取）')
+    parser.add_argument('--pipeline', action='store_true', help='使用后台线程写库，解析与写入重叠进行')
+    parser.add_argument('--reject-file', type=str, default='tick_import_rejects.csv',
+                        help='保存失败的Tick及异常信息写入的CSV文件')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='导入文件夹时的解析进程数，数据库写入始终在主进程中完成（默认1）')
+    parser.add_argument('--manifest', type=str, default=None,
+                        help='导入清单数据库路径（默认为vn.py运行目录下的tick_import_manifest.db）')
+    parser.add_argument('--no-manifest', action='store_true', help='不使用导入清单')
+    parser.add_argument('--force', action='store_true', help='重新导入清单中已完成的文件')
+    parser.add_argument('--metrics-log', type=str, default=None,
+                        help='每个文件导入结束后追加写入分阶段统计的JSON-lines日志文件')
+    parser.add_argument('--bulk', action='store_true',
+                        help='不构造TickData，直接批量写入vnpy_sqlite数据表（仅列式解析有效）')
+    parser.add_argument('--raw-tree', action='store_true',
+                        help='直接导入未预处理的 年月/日期/*.csv 目录树：合并TradingDay和UpdateTime后入库，不生成中间CSV')
+    parser.add_argument('--store', action='store_true',
+                        help='导入预处理生成的Parquet存储（产品/交易日.parquet）')
+    parser.add_argument('--start-date', type=str, default=None,
+                        help='--raw-tree、--store时只导入该日期及之后的数据（YYYYMMDD）')
+    parser.add_argument('--end-date', type=str, default=None,
+                        help='--raw-tree、--store时只导入该日期及之前的数据（YYYYMMDD）')
 
     args = parser.parse_args()
 
     try:
         # 创建导入器
-        importer = CFFEXTickDataImporterFixed()
+        manifest_file = None
+        if not args.no_manifest:
+            manifest_file = args.manifest or str(get_file_path('tick_import_manifest.db'))
+        importer = CFFEXTickDataImporterFixed(reject_file=args.reject_file, manifest_file=manifest_file,
+                                              bulk=args.bulk, metrics_log=args.metrics_log,
+                                              raw_times=args.raw_tree)
+        if args.raw_tree and args.row_mode:
+            print("⚠️  --raw-tree只支持列式解析，忽略--row-mode")
+            args.row_mode = False
+
+        def skip_imported(files: List[Path]) -> List[Path]:
+            """过滤掉清单中已完整导入且内容未变化的文件"""
+            if not importer.manifest or args.force:
+                return files
+
+            pending = []
+            for file_path in files:
+                if importer.manifest.is_imported(file_path):
+                    all_stats.append({'file': str(file_path), 'skipped': True})
+                else:
+                    pending.append(file_path)
+            return pending
+
+        def import_one(file_path: Path) -> Dict:
+            if args.chunk_size > 0:
+                return importer.import_file_chunked(file_path, batch_size=args.batch_size,
+                                                    chunk_size=args.chunk_size, pipeline=args.pipeline)
+            return importer.import_file(file_path, batch_size=args.batch_size,
+                                        vectorized=not args.row_mode, pipeline=args.pipeline)
 
         path = Path(args.path)
         all_stats = []
 
+        if (args.raw_tree or args.store) and path.is_file():
+            print(f"--raw-tree、--store需要数据根目录: {path}")
+            sys.exit(1)
+
         if path.is_file():
-            # 处理单个文件
+            # 处理单个文件（zip压缩包中可能有多个CSV文件）
             print(f"处理文件: {path}")
-            stats = importer.import_file(path, batch_size=args.batch_size)
-            all_stats.append(stats)
+            csv_files = skip_imported(expand_csv_sources([path]))
+            for i, csv_file in enumerate(csv_files, 1):
+                if len(csv_files) > 1:
+                    print(f"\n[{i}/{len(csv_files)}] 处理文件: {csv_file.name}")
+                stats = import_one(csv_file)
+                all_stats.append(stats)
 
         elif path.is_dir():
             # 处理文件夹下所有CSV文件
             print(f"处理文件夹: {path}")
-            csv_files = list(path.glob("*.csv"))
+            if args.raw_tree:
+                csv_files = [csv_file for csv_file, _ in iter_raw_files(path, args.start_date, args.end_date)]
+            elif args.store:
+                csv_files = list_partitions(path, start_date=args.start_date, end_date=args.end_date)
+            else:
+                csv_files = list_csv_sources(path)
             if not csv_files:
                 print(f"文件夹中没有CSV文件: {path}")
                 sys.exit(1)
 
             print(f"找到 {len(csv_files)} 个CSV文件")
-
-            for i, csv_file in enumerate(csv_files, 1):
-                print(f"\n[{i}/{len(csv_files)}] 处理文件: {csv_file.name}")
-                stats = importer.import_file(csv_file, batch_size=args.batch_size)
-                all_stats.append(stats)
+            csv_files = skip_imported(csv_files)
+
+            if args.workers > 1:
+                if args.chunk_size > 0 or args.row_mode:
+                    print("⚠️  多进程模式按整文件列式解析，忽略--chunk-size和--row-mode")
+                print(f"使用 {args.workers} 个解析进程")
+                all_stats.extend(import_files_parallel(importer, csv_files, args.workers, args.batch_size,
+                                                       pipeline=args.pipeline))
+            else:
+                for i, csv_file in enumerate(csv_files, 1):
+                    print(f"\n[{i}/{len(csv_files)}] 处理文件: {csv_file.name}")
+                    stats = import_one(csv_file)
+                    all_stats.append(stats)
 
         else:
             print(f"路径不存在: {path}")
@@ -382,8 +1036,13 @@ def main():
         total_saved = 0
         all_symbols = set()
 
+        skipped_files = 0
+
         for stats in all_stats:
-            if 'error' in stats:
+            if stats.get('skipped'):
+                skipped_files += 1
+                print(f"⏭️  {Path(stats['file']).name}: 已导入，跳过")
+            elif 'error' in stats:
                 print(f"❌ {stats['file']}: {stats['error']}")
             else:
                 successful_files += 1
@@ -399,12 +1058,25 @@ def main():
                       f"保存:{stats['saved_ticks']}, "
                       f"合约:{len(stats['unique_symbols'])}")
 
-        print(f"\n总计: {successful_files}/{total_files} 个文件成功")
+                if stats.get('datetime_rejects'):
+                    print(f"   ⚠️  时间无法解析: {stats['datetime_rejects']} 行，"
+                          f"示例: {stats['datetime_reject_samples']}")
+                if stats.get('metrics'):
+                    print(f"   ⏱️  {format_stages(stats['metrics'])}")
+
+        print(f"\n总计: {successful_files}/{total_files - skipped_files} 个文件成功")
+        if skipped_files:
+            print(f"跳过已导入文件: {skipped_files} 个")
         print(f"总行数: {total_rows}")
         print(f"有效Tick数: {total_valid}")
         print(f"无效行数: {total_invalid}")
         print(f"保存Tick数: {total_saved}")
         print(f"合约列表: {sorted(all_symbols)}")
+        if importer.reject_writer and importer.reject_writer.count:
+            print(f"保存失败Tick数: {importer.reject_writer.count}，已写入 {importer.reject_writer.file_path}")
+            importer.reject_writer.close()
+        if importer.manifest:
+            importer.manifest.close()
         print("=" * 60)
 
     except Exception as e: